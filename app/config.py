@@ -1,5 +1,7 @@
 """Конфигурация приложения: цвета, стили Plotly, константы."""
 
+import plotly.graph_objects as go
+
 # ── Цветовая палитра ──────────────────────────────────────────────
 BLUE = "#1565C0"
 RED = "#E53935"
@@ -24,6 +26,17 @@ NARRATIVE_COLORS = {
 
 NARRATIVE_TYPES = list(NARRATIVE_COLORS.keys())
 
+# ── Группы званий (rank_group из scripts/prepare_data.py) ─────────
+RANK_COLORS = {
+    "Другие": BLUE,
+    "Неизвестно": RED,
+    "Офицеры": LIGHT_BLUE,
+    "Рядовые": ORANGE,
+    "Сержанты/старшины": GREEN,
+}
+
+RANK_GROUPS = list(RANK_COLORS.keys())
+
 # ── Месяцы на русском ─────────────────────────────────────────────
 MONTHS_RU = [
     "Янв", "Фев", "Мар", "Апр", "Май", "Июн",
@@ -55,6 +68,11 @@ PLOTLY_LAYOUT = dict(
     colorway=PALETTE,
 )
 
+# Тот же layout, провалидированный один раз: go.Figure(layout=BASE_LAYOUT)
+# копирует готовый объект, а не разбирает **PLOTLY_LAYOUT в каждом графике.
+# Не шаблон plotly: тема Streamlit в st.plotly_chart перекрывает значения шаблона.
+BASE_LAYOUT = go.Layout(PLOTLY_LAYOUT)
+
 # ── Ключевые числа (fallback) ────────────────────────────────────
 TOTAL_CARDS = 981_467
 PCT_WITH_STORY = 65.0
@@ -77,3 +95,4 @@ SAMPLE_DIR = DATA_DIR / "sample"
 SAMPLE_FILE = SAMPLE_DIR / "soldiers_sample_50k.parquet"
 FULL_SEARCH_DIR  = DATA_DIR / "full"
 FULL_SEARCH_FILE = FULL_SEARCH_DIR / "soldiers_fts.parquet"  # single-file fallback
+FULL_SEARCH_DB   = FULL_SEARCH_DIR / "soldiers_full.duckdb"  # собирает prepare_data.py (иначе — приложение)
@@ -2,85 +2,198 @@
 
 import streamlit as st
 import pandas as pd
-import pathlib
-from config import AGG_DIR, SAMPLE_FILE, FULL_SEARCH_DIR, FULL_SEARCH_FILE
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from config import AGG_DIR, SAMPLE_FILE, FULL_SEARCH_DIR, FULL_SEARCH_FILE, FULL_SEARCH_DB
+
+
+# Узкие типы для столбцов агрегатов: только для графиков, точности хватает.
+# Целочисленный тип применяется, лишь если все значения целые и помещаются в него.
+AGG_DTYPES = {
+    "count": "int32",
+    "year": "int16",
+    "death_year": "int16",
+    "age": "int8",
+    "weight": "float32",
+}
+
+
+def _downcast(df: pd.DataFrame) -> pd.DataFrame:
+    """Привести известные числовые столбцы к AGG_DTYPES с проверкой диапазона."""
+    casts = {}
+    for col, dtype in AGG_DTYPES.items():
+        if col not in df.columns:
+            continue
+        s = df[col]
+        if np.dtype(dtype).kind == "f":
+            casts[col] = dtype
+            continue
+        info = np.iinfo(dtype)
+        if s.notna().all() and (s % 1 == 0).all() and info.min <= s.min() and s.max() <= info.max:
+            casts[col] = dtype
+    return df.astype(casts) if casts else df
+
+
+@st.cache_resource(show_spinner=False)
+def _all_agg() -> dict[str, pd.DataFrame]:
+    """Все агрегаты из AGG_DIR, прочитанные параллельно за один холодный старт.
+
+    Общий объект на процесс: наружу отдаётся только через load_* (cache_data
+    возвращает копии, так что правки на страницах не портят общий кэш).
+    """
+    paths = sorted(AGG_DIR.glob("*.parquet"))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        frames = pool.map(pd.read_parquet, paths)
+    return {path.name: _downcast(df) for path, df in zip(paths, frames)}
+
+
+def df_fingerprint(df: pd.DataFrame) -> tuple:
+    """Дешёвый ключ для st.cache_data(hash_funcs={pd.DataFrame: df_fingerprint}).
+
+    Агрегаты неизменны в пределах процесса, поэтому вместо хэша всех ячеек
+    хватает формы, схемы и крайних строк — O(столбцов), а не O(строк).
+    """
+    edge = df.iloc[[0, -1]] if len(df) else df
+    return (
+        df.shape,
+        tuple(df.columns),
+        tuple(str(t) for t in df.dtypes),
+        tuple(pd.util.hash_pandas_object(edge, index=False)),
+    )
 
 
 def _load_parquet(name: str) -> pd.DataFrame:
     """Загрузить parquet-файл из директории агрегатов."""
-    path =  AGG_DIR / name
-    if not path.exists():
-        st.error(f"Файл не найден: {path}")
+    agg = _all_agg()
+    if name not in agg:
+        st.error(f"Файл не найден: {AGG_DIR / name}")
         return pd.DataFrame()
-    return pd.read_parquet(path)
+    return agg[name]
 
 
-@st.cache_data(ttl=3600)
+@st.cache_data(show_spinner=False)
 def load_monthly_counts() -> pd.DataFrame:
-    return _load_parquet("monthly_counts.parquet")
+    """Помесячные счётчики: month уже datetime, year и m (номер месяца) — из него."""
+    df = _load_parquet("monthly_counts.parquet")
+    if df.empty:
+        return df
+    month = pd.to_datetime(df["month"])
+    return df.assign(
+        month=month,
+        year=month.dt.year.astype("int16"),
+        m=month.dt.month.astype("int16"),
+    )
 
 
-@st.cache_data(ttl=3600)
+@st.cache_data(show_spinner=False)
 def load_yearly_stats() -> pd.DataFrame:
     return _load_parquet("yearly_stats.parquet")
 
 
-@st.cache_data(ttl=3600)
+@st.cache_data(show_spinner=False)
 def load_region_stats() -> pd.DataFrame:
     return _load_parquet("region_stats.parquet")
 
 
-@st.cache_data(ttl=3600)
+@st.cache_data(show_spinner=False)
 def load_rank_age_distribution() -> pd.DataFrame:
     return _load_parquet("rank_age_distribution.parquet")
 
 
-@st.cache_data(ttl=3600)
+@st.cache_data(show_spinner=False)
+def load_age_by_rank() -> pd.DataFrame:
+    """Число карточек по (rank_group, age), годы гибели просуммированы."""
+    df = _load_parquet("rank_age_distribution.parquet")
+    if df.empty or not {"rank_group", "age", "count"} <= set(df.columns):
+        return pd.DataFrame()
+    return df.groupby(["rank_group", "age"], sort=True)["count"].sum().reset_index()
+
+
+@st.cache_data(show_spinner=False)
+def load_medage_by_rank_year() -> pd.DataFrame:
+    """Медианный возраст по (rank_group, death_year); при наличии count — взвешенный."""
+    df = _load_parquet("rank_age_distribution.parquet")
+    if df.empty or not {"rank_group", "age", "death_year"} <= set(df.columns):
+        return pd.DataFrame()
+    if "count" not in df.columns:
+        return (
+            df.groupby(["rank_group", "death_year"], sort=False)["age"]
+            .median().reset_index(name="median_age")
+        )
+
+    # Взвешенная медиана в каждой ячейке (звание × год гибели):
+    # сортировка по (ячейка, возраст), накопленные веса, первая позиция ≥ половины
+    rg_codes, rg_labels = pd.factorize(df["rank_group"], sort=True)
+    years = df["death_year"].to_numpy()
+    y0 = years.min()
+    n_years = years.max() - y0 + 1
+    cells = rg_codes * n_years + (years - y0)
+    order = np.lexsort((df["age"].to_numpy(), cells))
+    cells = cells[order]
+    ages = df["age"].to_numpy()[order]
+    counts = df["count"].to_numpy()[order]
+
+    starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+    sizes = np.diff(np.r_[starts, len(cells)])
+    cum = np.cumsum(counts)
+    within = cum - np.repeat((cum - counts)[starts], sizes)
+    half = np.repeat(np.add.reduceat(counts, starts) / 2, sizes)
+    pos = np.where(within >= half, np.arange(len(cells)), len(cells))
+    median_idx = np.minimum.reduceat(pos, starts)
+
+    return pd.DataFrame({
+        "rank_group": np.asarray(rg_labels)[cells[starts] // n_years],
+        "death_year": cells[starts] % n_years + y0,
+        "median_age": ages[median_idx],
+    })
+
+
+@st.cache_data(show_spinner=False)
 def load_narrative_types_yearly() -> pd.DataFrame:
     return _load_parquet("narrative_types_yearly.parquet")
 
 
-@st.cache_data(ttl=3600)
+@st.cache_data(show_spinner=False)
 def load_sentiment_yearly() -> pd.DataFrame:
     return _load_parquet("sentiment_yearly.parquet")
 
 
-@st.cache_data(ttl=3600)
+@st.cache_data(show_spinner=False)
 def load_mattr_yearly() -> pd.DataFrame:
     return _load_parquet("mattr_yearly.parquet")
 
 
-@st.cache_data(ttl=3600)
+@st.cache_data(show_spinner=False)
 def load_lda_topics() -> pd.DataFrame:
     return _load_parquet("lda_topics.parquet")
 
 
-@st.cache_data(ttl=3600)
+@st.cache_data(show_spinner=False)
 def load_lda_evolution() -> pd.DataFrame:
     return _load_parquet("lda_evolution.parquet")
 
 
-@st.cache_data(ttl=3600)
+@st.cache_data(show_spinner=False)
 def load_migration_matrix() -> pd.DataFrame:
     return _load_parquet("migration_matrix.parquet")
 
 
-@st.cache_data(ttl=3600)
+@st.cache_data(show_spinner=False)
 def load_dmi_by_region() -> pd.DataFrame:
     return _load_parquet("dmi_by_region.parquet")
 
 
-@st.cache_data(ttl=3600)
+@st.cache_data(show_spinner=False)
 def load_ner_top_entities() -> pd.DataFrame:
     return _load_parquet("ner_top_entities.parquet")
 
 
-@st.cache_data(ttl=3600)
+@st.cache_data(show_spinner=False)
 def load_halflife_yearly() -> pd.DataFrame:
     return _load_parquet("halflife_yearly.parquet")
 
 
-@st.cache_data(ttl=3600)
+@st.cache_data(show_spinner=False)
 def load_network_edges() -> pd.DataFrame:
     return _load_parquet("network_edges.parquet")
 
@@ -89,16 +202,43 @@ def load_network_edges() -> pd.DataFrame:
 def get_duckdb_connection():
     """DuckDB-соединение для поиска по сэмплу 50K."""
     import duckdb
+    from search_db import BIRTH_YEAR_SQL
 
     if not SAMPLE_FILE.exists():
         return None
     con = duckdb.connect(":memory:")
-    con.execute(
-        f"CREATE TABLE soldiers AS SELECT * FROM read_parquet('{SAMPLE_FILE}')"
-    )
+    # Год рождения извлекаем из строки birthday, чтобы фильтр по годам
+    # был целочисленным сравнением.
+    select = f"SELECT *, {BIRTH_YEAR_SQL} FROM read_parquet('{SAMPLE_FILE}')"
+    try:
+        con.execute("INSTALL fts; LOAD fts;")
+    except duckdb.Error:
+        # Без расширения fts (например, нет сети для INSTALL) поиск идёт через
+        # ILIKE, и копировать сэмпл в память незачем — читаем parquet напрямую.
+        con.execute(f"CREATE VIEW soldiers AS {select}")
+        return con
+
+    # Полнотекстовый индекс (BM25) по fio/story строится только по таблице,
+    # поэтому сэмпл материализуется; один раз на процесс.
+    con.execute(f"CREATE TABLE soldiers AS {select}")
+    try:
+        con.execute(
+            "PRAGMA create_fts_index('soldiers', 'id', 'fio', 'story', "
+            "stemmer='russian', stopwords='none')"
+        )
+    except duckdb.Error:
+        pass
     return con
 
 
+def has_fts_index(con, table: str) -> bool:
+    """Есть ли у таблицы FTS-индекс (схема fts_main_<table>)."""
+    return con.execute(
+        "SELECT COUNT(*) FROM duckdb_schemas() WHERE schema_name = ?",
+        [f"fts_main_{table}"],
+    ).fetchone()[0] > 0
+
+
 @st.cache_resource
 def get_full_search_connection():
     """DuckDB-соединение для поиска по полному FTS-датасету.
@@ -107,22 +247,29 @@ def get_full_search_connection():
       1. Чанки: data/full/soldiers_fts_part*.parquet  (< 100 MB каждый, совместимо с GitHub)
       2. Одиночный файл: data/full/soldiers_fts.parquet  (legacy / локальный)
 
+    Файл data/full/soldiers_full.duckdb собирает scripts/prepare_data.py; если его
+    нет (в git он не попадает), он устарел или FTS-индекс не удалось построить,
+    а расширение теперь доступно, — база собирается здесь (search_db). Дальше
+    она открывается только на чтение, без повторного разбора parquet.
+
     Возвращает None, если данные не найдены (откат на сэмпл 50K).
     """
     import duckdb
+    from search_db import build_full_search_db, configure, needs_rebuild
 
-    chunks = sorted(FULL_SEARCH_DIR.glob("soldiers_fts_part*.parquet"))
-    if chunks:
-        glob_str = str(FULL_SEARCH_DIR / "soldiers_fts_part*.parquet")
-        con = duckdb.connect(":memory:")
-        con.execute(f"CREATE TABLE soldiers_full AS SELECT * FROM read_parquet('{glob_str}')")
-        return con
+    sources = sorted(FULL_SEARCH_DIR.glob("soldiers_fts_part*.parquet"))
+    if not sources and FULL_SEARCH_FILE.exists():
+        sources = [FULL_SEARCH_FILE]
+    if not sources:
+        return None
 
-    if FULL_SEARCH_FILE.exists():
-        con = duckdb.connect(":memory:")
-        con.execute(
-            f"CREATE TABLE soldiers_full AS SELECT * FROM read_parquet('{FULL_SEARCH_FILE}')"
-        )
-        return con
+    if needs_rebuild(FULL_SEARCH_DB, sources):
+        build_full_search_db(sources, FULL_SEARCH_DB)
 
-    return None
+    con = duckdb.connect(str(FULL_SEARCH_DB), read_only=True)
+    configure(con)
+    try:
+        con.execute("LOAD fts")
+    except duckdb.Error:
+        pass
+    return con
@@ -6,7 +6,7 @@ import plotly.express as px
 import pandas as pd
 import numpy as np
 
-from config import PLOTLY_LAYOUT, BLUE, RED, LIGHT_BLUE, ORANGE, MONTHS_RU, MONTHS_RU_FULL, TOTAL_CARDS
+from config import BASE_LAYOUT, BLUE, RED, LIGHT_BLUE, ORANGE, MONTHS_RU, MONTHS_RU_FULL, TOTAL_CARDS
 from data_loader import load_monthly_counts, load_halflife_yearly
 
 st.title("📈 Динамика публикаций")
@@ -21,6 +21,9 @@ st.caption(f"Все графики рассчитаны на основе **{TOT
 df_monthly = load_monthly_counts()
 df_halflife = load_halflife_yearly()
 
+# Названия месяцев по номеру 1..12 — индексируются массивом номеров
+MONTH_NAMES = np.array(MONTHS_RU)
+
 # ═══════════════════════════════════════════════════════════════════
 # 1. Помесячная динамика
 # ═══════════════════════════════════════════════════════════════════
@@ -34,11 +37,10 @@ with st.expander("ℹ️ Как читать этот график"):
     )
 
 if not df_monthly.empty:
-    df_m = df_monthly.copy()
-    df_m["month"] = pd.to_datetime(df_m["month"])
+    df_m = df_monthly
 
     # Фильтр по годам
-    years = sorted(df_m["month"].dt.year.unique())
+    years = sorted(df_m["year"].unique())
     year_range = st.slider(
         "Диапазон лет",
         min_value=int(years[0]),
@@ -46,11 +48,12 @@ if not df_monthly.empty:
         value=(int(years[0]), int(years[-1])),
         key="dynamics_years",
     )
-    mask = df_m["month"].dt.year.between(*year_range)
+    mask = df_m["year"].between(*year_range)
     df_plot = df_m[mask]
 
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
+    fig = go.Figure(layout=BASE_LAYOUT)
+    # WebGL-трасса: отрисовка ряда на GPU вместо SVG-узлов
+    fig.add_trace(go.Scattergl(
         x=df_plot["month"],
         y=df_plot["count"],
         fill="tozeroy",
@@ -77,12 +80,13 @@ if not df_monthly.empty:
             )
 
     fig.update_layout(
-        **PLOTLY_LAYOUT,
         title="Количество опубликованных карточек по месяцам",
         xaxis_title="Дата",
         yaxis_title="Карточек",
         showlegend=False,
         height=450,
+        # Зум и панорама сохраняются при перемещении ползунка лет
+        uirevision="dynamics",
     )
     st.plotly_chart(fig, use_container_width=True)
 else:
@@ -100,21 +104,17 @@ with st.expander("ℹ️ Метод"):
     )
 
 if not df_monthly.empty:
-    df_s = df_monthly.copy()
-    df_s["month_dt"] = pd.to_datetime(df_s["month"])
-    df_s["m"] = df_s["month_dt"].dt.month
-    seasonal = df_s.groupby("m")["count"].sum().reset_index()
-    seasonal["month_name"] = seasonal["m"].map(lambda x: MONTHS_RU[x - 1])
-    seasonal["color"] = seasonal["m"].apply(lambda x: RED if x == 5 else BLUE)
+    seasonal = df_monthly.groupby("m")["count"].sum().reset_index()
+    seasonal["month_name"] = MONTH_NAMES[seasonal["m"].to_numpy() - 1]
+    seasonal["color"] = np.where(seasonal["m"].to_numpy() == 5, RED, BLUE)
 
     fig2 = go.Figure(go.Bar(
         x=seasonal["month_name"],
         y=seasonal["count"],
         marker_color=seasonal["color"],
         hovertemplate="%{x}<br>Карточек: %{y:,.0f}<extra></extra>",
-    ))
+    ), layout=BASE_LAYOUT)
     fig2.update_layout(
-        **PLOTLY_LAYOUT,
         title="Суммарные публикации по месяцам года",
         xaxis_title="Месяц",
         yaxis_title="Карточек (всего)",
@@ -137,20 +137,16 @@ with st.expander("ℹ️ Метод"):
 
 if not df_monthly.empty:
     df_n = df_monthly.copy()
-    df_n["month_dt"] = pd.to_datetime(df_n["month"])
-    df_n["year"] = df_n["month_dt"].dt.year
-    df_n["m"] = df_n["month_dt"].dt.month
 
     # Нормализация внутри года
-    year_totals = df_n.groupby("year")["count"].sum()
-    df_n = df_n.merge(year_totals.rename("year_total"), on="year")
+    df_n["year_total"] = df_n.groupby("year")["count"].transform("sum")
     df_n["pct"] = df_n["count"] / df_n["year_total"] * 100
-    df_n["month_name"] = df_n["m"].map(lambda x: MONTHS_RU[x - 1])
+    df_n["month_name"] = MONTH_NAMES[df_n["m"].to_numpy() - 1]
 
-    top_years = year_totals.nlargest(6).index.tolist()
+    top_years = df_n.drop_duplicates("year").nlargest(6, "year_total")["year"].tolist()
     df_top = df_n[df_n["year"].isin(top_years)]
 
-    fig3 = go.Figure()
+    fig3 = go.Figure(layout=BASE_LAYOUT)
     colors = [BLUE, RED, LIGHT_BLUE, ORANGE, "#66BB6A", "#AB47BC"]
     for i, yr in enumerate(sorted(top_years)):
         sub = df_top[df_top["year"] == yr].sort_values("m")
@@ -165,7 +161,6 @@ if not df_monthly.empty:
         ))
 
     fig3.update_layout(
-        **PLOTLY_LAYOUT,
         title="Доля публикаций по месяцам (нормализовано, топ-6 годов)",
         xaxis_title="Месяц",
         yaxis_title="Доля (%)",
@@ -188,7 +183,7 @@ with st.expander("ℹ️ Что такое полураспад?"):
 if not df_halflife.empty:
     df_h = df_halflife.sort_values("year")
 
-    fig4 = go.Figure()
+    fig4 = go.Figure(layout=BASE_LAYOUT)
     fig4.add_trace(go.Bar(
         x=df_h["year"],
         y=df_h["halflife"],
@@ -199,18 +194,21 @@ if not df_halflife.empty:
 
     # Линейный тренд
     if len(df_h) > 2:
-        z = np.polyfit(df_h["year"], df_h["halflife"], 1)
-        trend_y = np.polyval(z, df_h["year"])
+        # МНК для прямой в замкнутой форме — без Вандермонда и LAPACK
+        x = df_h["year"].to_numpy(dtype=float)
+        y = df_h["halflife"].to_numpy(dtype=float)
+        xm, ym = x.mean(), y.mean()
+        slope = ((x - xm) * (y - ym)).sum() / ((x - xm) ** 2).sum()
+        trend_y = slope * (x - xm) + ym
         fig4.add_trace(go.Scatter(
             x=df_h["year"],
             y=trend_y,
             mode="lines",
-            name=f"Тренд ({z[0]:+.2f} дн/год)",
+            name=f"Тренд ({slope:+.2f} дн/год)",
             line=dict(color=RED, dash="dash", width=2),
         ))
 
     fig4.update_layout(
-        **PLOTLY_LAYOUT,
         title="Полураспад активности по годам",
         xaxis_title="Год",
         yaxis_title="Дни",
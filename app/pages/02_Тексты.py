@@ -2,18 +2,19 @@
 
 import streamlit as st
 import plotly.graph_objects as go
+import plotly.express as px
 import pandas as pd
 import numpy as np
 
 from config import (
-    PLOTLY_LAYOUT, BLUE, RED, GREY,
+    BASE_LAYOUT, BLUE, RED, GREY,
     NARRATIVE_COLORS, NARRATIVE_TYPES, PALETTE, ORANGE,
     TOTAL_CARDS,
 )
 from data_loader import (
     load_narrative_types_yearly, load_sentiment_yearly,
     load_mattr_yearly, load_lda_topics, load_lda_evolution,
-    load_ner_top_entities,
+    load_ner_top_entities, df_fingerprint,
 )
 
 st.title("📝 Анализ текстов")
@@ -31,15 +32,32 @@ df_topics = load_lda_topics()
 df_lda_ev = load_lda_evolution()
 df_ner = load_ner_top_entities()
 
+
+@st.cache_data(show_spinner=False)
+def _mattr_trend(years: np.ndarray, values: np.ndarray) -> tuple[float, float]:
+    """Наклон и сдвиг линейного тренда MATTR — считается один раз, а не на каждый rerun."""
+    slope, intercept = np.polyfit(years, values, 1)
+    return float(slope), float(intercept)
+
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: df_fingerprint})
+def _top_words_per_topic(df: pd.DataFrame, k: int = 8) -> dict:
+    """Топ-k слов каждой темы: один проход groupby вместо фильтра на тему."""
+    return {tid: g.nlargest(k, "weight") for tid, g in df.groupby("topic_id", sort=True)}
+
+
 # ═══════════════════════════════════════════════════════════════════
-tab1, tab2, tab3, tab4, tab5 = st.tabs([
-    "📖 Нарративы", "💬 Тональность", "🔤 MATTR", "🧩 LDA-темы", "🏷️ NER",
-])
+# Переключатель вместо st.tabs: st.tabs выполняет тела всех вкладок на каждом
+# rerun, а здесь строится только выбранный раздел.
+TEXT_TABS = ["📖 Нарративы", "💬 Тональность", "🔤 MATTR", "🧩 LDA-темы", "🏷️ NER"]
+active_tab = st.radio(
+    "Раздел", TEXT_TABS, horizontal=True, key="txt_tab", label_visibility="collapsed",
+)
 
 # ═══════════════════════════════════════════════════════════════════
 # TAB 1: Нарративы
 # ═══════════════════════════════════════════════════════════════════
-with tab1:
+if active_tab == TEXT_TABS[0]:
     st.subheader("Типы нарративов")
 
     with st.expander("ℹ️ Методология"):
@@ -62,21 +80,23 @@ with tab1:
         col1, col2 = st.columns(2)
 
         with col1:
-            fig = go.Figure()
-            for ntype in NARRATIVE_TYPES:
-                if ntype in df_narr.columns:
-                    fig.add_trace(go.Scatter(
-                        x=df_narr["year"],
-                        y=df_narr[ntype],
-                        mode="lines",
-                        name=ntype,
-                        stackgroup="one",
-                        line=dict(color=NARRATIVE_COLORS.get(ntype, GREY), width=0.5),
-                        hovertemplate=f"{ntype}<br>Год: %{{x}}<br>Доля: %{{y:.1f}}%<extra></extra>",
-                    ))
+            ntypes = [t for t in NARRATIVE_TYPES if t in df_narr.columns]
+            narr_long = df_narr.melt(
+                id_vars="year", value_vars=ntypes, var_name="ntype", value_name="share",
+            )
+            fig = px.area(
+                narr_long, x="year", y="share", color="ntype",
+                color_discrete_map=NARRATIVE_COLORS,
+                category_orders={"ntype": ntypes},
+            )
+            fig.update_traces(
+                line_width=0.5,
+                hovertemplate="%{fullData.name}<br>Год: %{x}<br>Доля: %{y:.1f}%<extra></extra>",
+            )
             fig.update_layout(
-                **PLOTLY_LAYOUT,
+                BASE_LAYOUT,
                 title="Доли нарративов по годам (%)",
+                legend_title_text=None,
                 xaxis_title="Год публикации",
                 yaxis_title="Доля (%)",
                 height=420,
@@ -91,16 +111,15 @@ with tab1:
                     means[ntype] = df_narr[ntype].mean()
             if means:
                 fig2 = go.Figure(go.Bar(
-                    y=list(means.keys()),
-                    x=list(means.values()),
+                    y=list(means),
+                    x=np.fromiter(means.values(), dtype=np.float64, count=len(means)),
                     orientation="h",
                     marker_color=[NARRATIVE_COLORS.get(k, GREY) for k in means],
                     text=[f"{v:.1f}%" for v in means.values()],
                     textposition="outside",
                     hovertemplate="%{y}: %{x:.1f}%<extra></extra>",
-                ))
+                ), layout=BASE_LAYOUT)
                 fig2.update_layout(
-                    **PLOTLY_LAYOUT,
                     title="Средняя доля каждого типа нарратива",
                     xaxis_title="Доля (%)",
                     height=420,
@@ -121,7 +140,7 @@ with tab1:
 # ═══════════════════════════════════════════════════════════════════
 # TAB 2: Тональность
 # ═══════════════════════════════════════════════════════════════════
-with tab2:
+elif active_tab == TEXT_TABS[1]:
     st.subheader("Тональность текстов")
 
     with st.expander("ℹ️ Методология"):
@@ -142,7 +161,7 @@ with tab2:
         col1, col2 = st.columns(2)
 
         with col1:
-            fig = go.Figure()
+            fig = go.Figure(layout=BASE_LAYOUT)
             if "mean_score" in df_sent.columns:
                 fig.add_trace(go.Scatter(
                     x=df_sent["year"],
@@ -158,7 +177,6 @@ with tab2:
                     annotation_text="Нейтральный", annotation_position="bottom right",
                 )
             fig.update_layout(
-                **PLOTLY_LAYOUT,
                 title="Средняя тональность по годам",
                 xaxis_title="Год публикации",
                 yaxis_title="Sentiment score",
@@ -179,16 +197,15 @@ with tab2:
                     "Смешанный":        0.08,
                 }
             fig2 = go.Figure(go.Bar(
-                x=list(means.keys()),
-                y=list(means.values()),
+                x=list(means),
+                y=np.fromiter(means.values(), dtype=np.float64, count=len(means)),
                 marker_color=[NARRATIVE_COLORS.get(k, GREY) for k in means],
                 text=[f"{v:+.2f}" for v in means.values()],
                 textposition="outside",
                 hovertemplate="%{x}<br>Score: %{y:.3f}<extra></extra>",
-            ))
+            ), layout=BASE_LAYOUT)
             fig2.add_hline(y=0, line_dash="dot", line_color=RED, opacity=0.4)
             fig2.update_layout(
-                **PLOTLY_LAYOUT,
                 title="Тональность по типам нарративов",
                 xaxis_title="Тип нарратива",
                 yaxis_title="Средний sentiment score",
@@ -211,7 +228,7 @@ with tab2:
 # ═══════════════════════════════════════════════════════════════════
 # TAB 3: MATTR
 # ═══════════════════════════════════════════════════════════════════
-with tab3:
+elif active_tab == TEXT_TABS[2]:
     st.subheader("Лексическое разнообразие (MATTR)")
 
     with st.expander("ℹ️ Что такое MATTR?"):
@@ -237,7 +254,7 @@ with tab3:
         col1, col2 = st.columns(2)
 
         with col1:
-            fig = go.Figure()
+            fig = go.Figure(layout=BASE_LAYOUT)
             fig.add_trace(go.Scatter(
                 x=df_mattr["year"],
                 y=df_mattr["mattr"],
@@ -249,19 +266,18 @@ with tab3:
             ))
 
             if len(df_mattr) > 2:
-                z = np.polyfit(df_mattr["year"], df_mattr["mattr"], 1)
-                trend = np.polyval(z, df_mattr["year"])
-                direction = "↓ снижается" if z[0] < 0 else "↑ растёт"
+                years = df_mattr["year"].to_numpy()
+                slope, intercept = _mattr_trend(years, df_mattr["mattr"].to_numpy())
+                direction = "↓ снижается" if slope < 0 else "↑ растёт"
                 fig.add_trace(go.Scatter(
                     x=df_mattr["year"],
-                    y=trend,
+                    y=slope * years + intercept,
                     mode="lines",
-                    name=f"Тренд ({z[0]:+.4f}/год, {direction})",
+                    name=f"Тренд ({slope:+.4f}/год, {direction})",
                     line=dict(color=RED, dash="dash", width=2),
                 ))
 
             fig.update_layout(
-                **PLOTLY_LAYOUT,
                 title="Общий MATTR по годам",
                 xaxis_title="Год публикации",
                 yaxis_title="MATTR",
@@ -273,7 +289,7 @@ with tab3:
         with col2:
             type_cols = [c for c in df_mattr.columns if c.startswith("mattr_")]
             if type_cols:
-                fig2 = go.Figure()
+                fig2 = go.Figure(layout=BASE_LAYOUT)
                 for c in type_cols:
                     ntype = c.replace("mattr_", "")
                     valid = df_mattr[["year", c]].dropna()
@@ -289,7 +305,6 @@ with tab3:
                         hovertemplate=f"{ntype}<br>Год: %{{x}}<br>MATTR: %{{y:.4f}}<extra></extra>",
                     ))
                 fig2.update_layout(
-                    **PLOTLY_LAYOUT,
                     title="MATTR по типам нарративов (по годам)",
                     xaxis_title="Год публикации",
                     yaxis_title="MATTR",
@@ -304,15 +319,14 @@ with tab3:
                 }
                 sorted_means = dict(sorted(means.items(), key=lambda x: x[1]))
                 fig2 = go.Figure(go.Bar(
-                    x=list(sorted_means.keys()),
-                    y=list(sorted_means.values()),
+                    x=list(sorted_means),
+                    y=np.fromiter(sorted_means.values(), dtype=np.float64, count=len(sorted_means)),
                     marker_color=[NARRATIVE_COLORS.get(k, GREY) for k in sorted_means],
                     text=[f"{v:.3f}" for v in sorted_means.values()],
                     textposition="outside",
                     hovertemplate="%{x}<br>MATTR: %{y:.4f}<extra></extra>",
-                ))
+                ), layout=BASE_LAYOUT)
                 fig2.update_layout(
-                    **PLOTLY_LAYOUT,
                     title="MATTR по типам нарративов (среднее)",
                     xaxis_title="Тип нарратива",
                     yaxis_title="Средний MATTR",
@@ -336,7 +350,7 @@ with tab3:
 # ═══════════════════════════════════════════════════════════════════
 # TAB 4: LDA
 # ═══════════════════════════════════════════════════════════════════
-with tab4:
+elif active_tab == TEXT_TABS[3]:
     st.subheader("Тематическое моделирование (LDA)")
 
     with st.expander("ℹ️ Методология"):
@@ -354,22 +368,20 @@ with tab4:
             f"LDA-модель обучена на текстовом корпусе из **{TOTAL_CARDS:,}** карточек. "
             "Показаны 7 тем и их эволюция по годам.".replace(",", "\u202f")
         )
-        topics_list = sorted(df_topics["topic_id"].unique())
+        top_words = _top_words_per_topic(df_topics)
         n_cols = 3
         cols = st.columns(n_cols)
-        for i, tid in enumerate(topics_list[:7]):
-            sub = df_topics[df_topics["topic_id"] == tid].nlargest(8, "weight")
+        for i, (tid, sub) in enumerate(list(top_words.items())[:7]):
             with cols[i % n_cols]:
                 fig = go.Figure(go.Bar(
-                    y=sub["word"],
-                    x=sub["weight"],
+                    y=sub["word"].to_numpy(),
+                    x=sub["weight"].to_numpy(),
                     orientation="h",
                     marker_color=PALETTE[i % len(PALETTE)],
                     hovertemplate="%{y}: %{x:.3f}<extra></extra>",
-                ))
+                ), layout=BASE_LAYOUT)
                 topic_label = sub["topic_label"].iloc[0] if "topic_label" in sub.columns else f"Тема {tid}"
                 fig.update_layout(
-                    **PLOTLY_LAYOUT,
                     title=f"{topic_label}",
                     height=280,
                     showlegend=False,
@@ -382,23 +394,24 @@ with tab4:
         st.markdown("---")
         st.markdown("#### Эволюция тем по годам")
 
-        fig_ev = go.Figure()
         topic_cols = [c for c in df_lda_ev.columns if c.startswith("topic_")]
-        for i, col in enumerate(topic_cols):
-            label = col.replace("topic_", "").replace("_", " ").title()
-            fig_ev.add_trace(go.Scatter(
-                x=df_lda_ev["year"],
-                y=df_lda_ev[col],
-                mode="lines",
-                name=label,
-                stackgroup="one",
-                line=dict(width=0.5, color=PALETTE[i % len(PALETTE)]),
-                hovertemplate=f"{label}<br>Год: %{{x}}<br>Вес: %{{y:.3f}}<extra></extra>",
-            ))
+        labels = {c: c.replace("topic_", "").replace("_", " ").title() for c in topic_cols}
+        ev_long = df_lda_ev.rename(columns=labels).melt(
+            id_vars="year", value_vars=list(labels.values()), var_name="topic", value_name="weight",
+        )
+        fig_ev = px.area(
+            ev_long, x="year", y="weight", color="topic",
+            color_discrete_sequence=PALETTE,
+        )
+        fig_ev.update_traces(
+            line_width=0.5,
+            hovertemplate="%{fullData.name}<br>Год: %{x}<br>Вес: %{y:.3f}<extra></extra>",
+        )
 
         fig_ev.update_layout(
-            **PLOTLY_LAYOUT,
+            BASE_LAYOUT,
             title="Динамика тематических весов",
+            legend_title_text=None,
             xaxis_title="Год публикации",
             yaxis_title="Средний вес темы",
             height=450,
@@ -420,7 +433,7 @@ with tab4:
 # ═══════════════════════════════════════════════════════════════════
 # TAB 5: NER
 # ═══════════════════════════════════════════════════════════════════
-with tab5:
+elif active_tab == TEXT_TABS[4]:
     st.subheader("Именованные сущности (NER)")
 
     with st.expander("ℹ️ Методология"):
@@ -436,26 +449,32 @@ with tab5:
         )
         col1, col2 = st.columns(2)
 
+        # Топ-30 каждого типа за один проход: стабильная сортировка + head по группам
+        # (при равенстве — порядок строк, как у nlargest)
+        ner_top = df_ner.sort_values("count", ascending=False, kind="stable").groupby(
+            "entity_type", sort=False,
+        ).head(30)
+
         for etype, title, col in [
             ("LOC", "Топ-30 локаций", col1),
             ("ORG", "Топ-30 организаций", col2),
         ]:
-            sub = df_ner[df_ner["entity_type"] == etype].nlargest(30, "count")
+            sub = ner_top[ner_top["entity_type"] == etype]
             if sub.empty:
                 continue
             with col:
                 fig = go.Figure(go.Bar(
-                    y=sub["entity"].iloc[::-1],
-                    x=sub["count"].iloc[::-1],
+                    y=sub["entity"].to_numpy()[::-1],
+                    x=sub["count"].to_numpy()[::-1],
                     orientation="h",
                     marker_color=BLUE if etype == "LOC" else ORANGE,
                     hovertemplate="%{y}<br>Упоминаний: %{x:,.0f}<extra></extra>",
-                ))
+                ), layout=BASE_LAYOUT)
                 fig.update_layout(
-                    **PLOTLY_LAYOUT,
                     title=title,
                     height=700,
                     showlegend=False,
+                    uirevision="keep",  # зум не сбрасывается при перерисовке
                 )
                 fig.update_layout(margin=dict(l=180, r=10, t=40, b=30))
                 st.plotly_chart(fig, use_container_width=True)
@@ -3,9 +3,10 @@
 import streamlit as st
 import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
 
-from config import PLOTLY_LAYOUT, BLUE, RED, LIGHT_BLUE, ORANGE, GREEN, PCT_LOCAL_MEMORY, TOTAL_CARDS
-from data_loader import load_migration_matrix, load_network_edges
+from config import BASE_LAYOUT, BLUE, RED, LIGHT_BLUE, ORANGE, GREEN, PCT_LOCAL_MEMORY, TOTAL_CARDS
+from data_loader import load_migration_matrix, load_network_edges, df_fingerprint
 
 st.title("🗺️ География памяти")
 
@@ -19,6 +20,37 @@ st.caption(f"Миграционный анализ рассчитан на ос
 df_mig = load_migration_matrix()
 df_edges = load_network_edges()
 
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: df_fingerprint})
+def _mig_matrix(df: pd.DataFrame, top_n: int) -> pd.DataFrame:
+    """Квадратная матрица миграции для топ-N регионов (кэш на каждое значение ползунка)."""
+    # Определяем топ-N регионов по суммарному количеству
+    region_sums = (
+        df.groupby("birth_region")["count"].sum()
+        .add(df.groupby("submit_region")["count"].sum(), fill_value=0)
+    )
+    top_regions = region_sums.nlargest(top_n).index.tolist()
+
+    # Индексы строк/столбцов в порядке рейтинга; пары вне топа отбрасываются
+    pos = {r: i for i, r in enumerate(top_regions)}
+    rows = df["birth_region"].map(pos)
+    cols = df["submit_region"].map(pos)
+    keep = (rows.notna() & cols.notna()).to_numpy()
+    rows = rows.to_numpy()[keep].astype(np.intp)
+    cols = cols.to_numpy()[keep].astype(np.intp)
+
+    # Разброс count по ячейкам плотной матрицы вместо pivot_table
+    n = len(top_regions)
+    matrix = np.zeros((n, n), dtype=np.int64)
+    np.add.at(matrix, (rows, cols), df["count"].to_numpy()[keep])
+
+    # Как и раньше, оставляем регионы, встречающиеся и как рождение, и как подача
+    common = np.flatnonzero(
+        (np.bincount(rows, minlength=n) > 0) & (np.bincount(cols, minlength=n) > 0)
+    )
+    labels = [top_regions[i] for i in common]
+    return pd.DataFrame(matrix[np.ix_(common, common)], index=labels, columns=labels)
+
 # ═══════════════════════════════════════════════════════════════════
 # 1. Heatmap миграции
 # ═══════════════════════════════════════════════════════════════════
@@ -43,23 +75,7 @@ if not df_mig.empty:
 
     # Pivot к матрице
     if "birth_region" in df_mig.columns and "submit_region" in df_mig.columns:
-        # Определяем топ-N регионов по суммарному количеству
-        region_sums = (
-            df_mig.groupby("birth_region")["count"].sum()
-            .add(df_mig.groupby("submit_region")["count"].sum(), fill_value=0)
-        )
-        top_regions = region_sums.nlargest(top_n).index.tolist()
-
-        sub = df_mig[
-            df_mig["birth_region"].isin(top_regions) & df_mig["submit_region"].isin(top_regions)
-        ]
-        matrix = sub.pivot_table(
-            index="birth_region", columns="submit_region",
-            values="count", fill_value=0, aggfunc="sum",
-        )
-        # Упорядочиваем
-        common = [r for r in top_regions if r in matrix.index and r in matrix.columns]
-        matrix = matrix.loc[common, common]
+        matrix = _mig_matrix(df_mig, top_n)
 
         fig = go.Figure(go.Heatmap(
             z=matrix.values,
@@ -69,15 +85,15 @@ if not df_mig.empty:
             hovertemplate=(
                 "Рождение: %{y}<br>Подача: %{x}<br>Карточек: %{z:,.0f}<extra></extra>"
             ),
-        ))
+        ), layout=BASE_LAYOUT)
         fig.update_layout(
-            **PLOTLY_LAYOUT,
             title=f"Миграционная матрица (топ-{top_n} регионов)",
             xaxis_title="Регион подачи",
             yaxis_title="Регион рождения",
             height=max(500, top_n * 25),
+            # Зум/панорама сохраняются при движении ползунка top_n
+            uirevision="geo_matrix",
         )
-        # FIX: xaxis/yaxis конфликтуют с PLOTLY_LAYOUT — переопределяем отдельным вызовом
         fig.update_xaxes(tickangle=45, tickfont=dict(size=10))
         fig.update_yaxes(tickfont=dict(size=10), autorange="reversed")
         st.plotly_chart(fig, use_container_width=True)
@@ -101,9 +117,8 @@ with col1:
         hole=0.4,
         textinfo="label+percent",
         hovertemplate="%{label}: %{value:.1f}%<extra></extra>",
-    ))
+    ), layout=BASE_LAYOUT)
     fig_pie.update_layout(
-        **PLOTLY_LAYOUT,
         title="Доля локальной памяти",
         height=350,
         showlegend=False,
@@ -148,14 +163,13 @@ if not df_edges.empty:
             orientation="h",
             marker_color=LIGHT_BLUE,
             hovertemplate="%{y}<br>Карточек: %{x:,.0f}<extra></extra>",
-        ))
-        # FIX: margin конфликтует с PLOTLY_LAYOUT — разбиваем на 2 вызова
+        ), layout=BASE_LAYOUT)
         fig_bar.update_layout(
-            **PLOTLY_LAYOUT,
             title="Топ-20 межрегиональных потоков памяти",
             xaxis_title="Количество карточек",
             height=550,
             showlegend=False,
+            uirevision="keep",
         )
         fig_bar.update_layout(margin=dict(l=300, r=30, t=50, b=50))
         st.plotly_chart(fig_bar, use_container_width=True)
@@ -3,10 +3,9 @@
 import streamlit as st
 import plotly.graph_objects as go
 import pandas as pd
-import numpy as np
 
-from config import PLOTLY_LAYOUT, BLUE, RED, PALETTE, AGE_GAP_RANGE, TOTAL_CARDS
-from data_loader import load_rank_age_distribution
+from config import BASE_LAYOUT, BLUE, RED, RANK_COLORS, RANK_GROUPS, AGE_GAP_RANGE, TOTAL_CARDS
+from data_loader import load_rank_age_distribution, load_age_by_rank, load_medage_by_rank_year
 
 st.title("🎖️ Демография ветеранов")
 
@@ -37,18 +36,29 @@ if not df.empty and "rank_group" in df.columns and "age" in df.columns:
             "возрастные профили рядовых и офицеров."
         )
 
-    rank_groups = sorted(df["rank_group"].unique())
-    colors = {rg: PALETTE[i % len(PALETTE)] for i, rg in enumerate(rank_groups)}
+    # Группы и цвета — фиксированный справочник из config, в данных только отбираем встречающиеся
+    observed = set(df["rank_group"].unique())
+    rank_groups = [rg for rg in RANK_GROUPS if rg in observed]
+    colors = RANK_COLORS
 
-    fig = go.Figure()
+    # count по age для каждой группы звания — готовый агрегат из загрузчика
+    age_by_rank = load_age_by_rank()
+
+    # Разбиение по группам — один groupby вместо маски на каждую группу
+    if not age_by_rank.empty:
+        age_groups = dict(list(age_by_rank.groupby("rank_group", sort=False)))
+    else:
+        age_groups = dict(list(df.groupby("rank_group", sort=False)["age"]))
+
+    # Трассы собираются списком и валидируются одним конструктором go.Figure
+    traces = []
     for rg in rank_groups:
-        sub = df[df["rank_group"] == rg]
-        if "count" in sub.columns:
-            # Агрегируем count по age для каждой группы звания (суммируем годы гибели)
-            age_totals = sub.groupby("age")["count"].sum().sort_index()
-            fig.add_trace(go.Scatter(
-                x=age_totals.index,
-                y=age_totals.values,
+        if not age_by_rank.empty:
+            age_totals = age_groups[rg]
+            # WebGL: заливка tozeroy в scattergl поддерживается, SVG-пути не строятся
+            traces.append(go.Scattergl(
+                x=age_totals["age"],
+                y=age_totals["count"],
                 mode="lines",
                 name=rg,
                 fill="tozeroy",
@@ -57,16 +67,16 @@ if not df.empty and "rank_group" in df.columns and "age" in df.columns:
                 hovertemplate=f"{rg}<br>Возраст: %{{x}}<br>Карточек: %{{y:,.0f}}<extra></extra>",
             ))
         else:
-            fig.add_trace(go.Histogram(
-                x=sub["age"],
+            traces.append(go.Histogram(
+                x=age_groups[rg],
                 name=rg,
                 marker_color=colors[rg],
                 opacity=0.6,
                 nbinsx=50,
             ))
 
+    fig = go.Figure(data=traces, layout=BASE_LAYOUT)
     fig.update_layout(
-        **PLOTLY_LAYOUT,
         title="Распределение возраста по категориям звания",
         xaxis_title="Возраст (лет)",
         yaxis_title="Количество карточек",
@@ -97,29 +107,20 @@ if not df.empty and "rank_group" in df.columns and "age" in df.columns:
         )
 
     if "death_year" in df.columns:
-        if "count" in df.columns:
-            df_tmp = df.copy()
-            df_tmp["weighted_age"] = df_tmp["age"] * df_tmp["count"]
-            _agg = df_tmp.groupby(["rank_group", "death_year"]).agg(
-                sum_w=("weighted_age", "sum"),
-                sum_c=("count", "sum"),
-            ).reset_index()
-            _agg["median_age"] = np.where(
-                _agg["sum_c"] > 0, _agg["sum_w"] / _agg["sum_c"], np.nan
-            )
-            agg = _agg.drop(columns=["sum_w", "sum_c"])
-        else:
-            agg = df.groupby(["rank_group", "death_year"])["age"].median().reset_index(name="median_age")
-
+        agg = load_medage_by_rank_year()
         agg = agg.dropna(subset=["median_age"])
         war_years = agg[agg["death_year"].between(1941, 1945)]
+        war_groups = {
+            rg: sub.sort_values("death_year")
+            for rg, sub in war_years.groupby("rank_group", sort=False)
+        }
 
-        fig2 = go.Figure()
+        traces = []
         for rg in rank_groups:
-            sub = war_years[war_years["rank_group"] == rg].sort_values("death_year")
-            if sub.empty:
+            sub = war_groups.get(rg)
+            if sub is None:
                 continue
-            fig2.add_trace(go.Scatter(
+            traces.append(go.Scatter(
                 x=sub["death_year"],
                 y=sub["median_age"],
                 mode="lines+markers",
@@ -129,8 +130,8 @@ if not df.empty and "rank_group" in df.columns and "age" in df.columns:
                 hovertemplate=f"{rg}<br>Год: %{{x}}<br>Медианный возраст: %{{y:.1f}}<extra></extra>",
             ))
 
+        fig2 = go.Figure(data=traces, layout=BASE_LAYOUT)
         fig2.update_layout(
-            **PLOTLY_LAYOUT,
             title="Медианный возраст по годам гибели (1941–1945)",
             xaxis_title="Год гибели",
             yaxis_title="Медианный возраст (лет)",
@@ -142,8 +143,9 @@ if not df.empty and "rank_group" in df.columns and "age" in df.columns:
         if len(rank_groups) >= 2:
             st.markdown("#### Динамика возрастного разрыва")
             rg1, rg2 = rank_groups[0], rank_groups[-1]
-            m1 = war_years[war_years["rank_group"] == rg1].set_index("death_year")["median_age"]
-            m2 = war_years[war_years["rank_group"] == rg2].set_index("death_year")["median_age"]
+            empty = pd.Series(dtype="float64")
+            m1 = war_groups[rg1].set_index("death_year")["median_age"] if rg1 in war_groups else empty
+            m2 = war_groups[rg2].set_index("death_year")["median_age"] if rg2 in war_groups else empty
             gap = (m2 - m1).dropna().reset_index()
             gap.columns = ["year", "gap"]
 
@@ -153,9 +155,8 @@ if not df.empty and "rank_group" in df.columns and "age" in df.columns:
                     y=gap["gap"],
                     marker_color=RED,
                     hovertemplate="Год %{x}<br>Разрыв: %{y:.1f} лет<extra></extra>",
-                ))
+                ), layout=BASE_LAYOUT)
                 fig3.update_layout(
-                    **PLOTLY_LAYOUT,
                     title=f"Разрыв медианного возраста: {rg2} − {rg1}",
                     xaxis_title="Год гибели",
                     yaxis_title="Разница (лет)",
@@ -6,8 +6,8 @@ import plotly.express as px
 import pandas as pd
 import numpy as np
 
-from config import PLOTLY_LAYOUT, BLUE, RED, LIGHT_BLUE, ORANGE, GREEN, DMI_GINI, STORY_VS_AWARDS_R, TOTAL_CARDS
-from data_loader import load_dmi_by_region
+from config import BASE_LAYOUT, BLUE, RED, LIGHT_BLUE, ORANGE, GREEN, DMI_GINI, STORY_VS_AWARDS_R, TOTAL_CARDS
+from data_loader import load_dmi_by_region, df_fingerprint
 
 st.title("📊 Индекс цифровой памяти (DMI)")
 
@@ -24,6 +24,49 @@ if df.empty:
     st.info("Данные dmi_by_region.parquet не найдены.")
     st.stop()
 
+# Выше порога точки рисуются через WebGL (Scattergl), а не SVG
+SCATTERGL_MIN_POINTS = 1000
+
+
+def _linfit(x: np.ndarray, y: np.ndarray) -> tuple[float, float, float]:
+    """МНК-прямая y = a + b·x в замкнутой форме (без polyfit/lstsq) и R².
+
+    R² = Sxy² / (Sxx·Syy) — из тех же сумм, без массива предсказаний.
+    """
+    xm, ym = x.mean(), y.mean()
+    dx, dy = x - xm, y - ym
+    sxx, sxy, syy = (dx * dx).sum(), (dx * dy).sum(), (dy * dy).sum()
+    b = sxy / sxx
+    a = ym - b * xm
+    r2 = sxy * sxy / (sxx * syy) if syy > 0 else 0
+    return float(a), float(b), float(r2)
+
+
+@st.cache_data(show_spinner=False)
+def _linear_trend(x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray, float]:
+    """Линия тренда (100 точек) и R² — от ввода пользователя не зависят, считаются один раз."""
+    a, b, r2 = _linfit(x, y)
+    trend_x = np.linspace(x.min(), x.max(), 100)
+    return trend_x, a + b * trend_x, r2
+
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: df_fingerprint})
+def _corr_matrix(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+    """Корреляционная матрица компонентов DMI (Pearson) в float32.
+
+    На тепловой карте — два знака после запятой, float32 хватает с запасом.
+    С пропусками — попарный расчёт pandas.
+    """
+    arr = df[cols].to_numpy(dtype=np.float32)
+    if np.isnan(arr).any():
+        return df[cols].corr()
+    arr -= arr.mean(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        arr /= np.sqrt((arr * arr).sum(axis=0))
+    corr = np.clip(arr.T @ arr, -1.0, 1.0)
+    return pd.DataFrame(corr, index=cols, columns=cols)
+
+
 # ═══════════════════════════════════════════════════════════════════
 # 1. Scatter: DMI vs Volume
 # ═══════════════════════════════════════════════════════════════════
@@ -40,36 +83,31 @@ if "count" in df.columns and "dmi" in df.columns:
     df_plot = df[df["count"] > 0].copy()
     df_plot["log_count"] = np.log10(df_plot["count"])
 
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
+    scatter_cls = go.Scattergl if len(df_plot) > SCATTERGL_MIN_POINTS else go.Scatter
+    traces = [scatter_cls(
         x=df_plot["log_count"],
         y=df_plot["dmi"],
         mode="markers",
         marker=dict(color=BLUE, size=8, opacity=0.7, line=dict(width=1, color="white")),
         text=df_plot["region"] if "region" in df_plot.columns else None,
         hovertemplate="%{text}<br>Карточек: 10^%{x:.1f}<br>DMI: %{y:.3f}<extra></extra>",
-    ))
+    )]
 
     # Тренд
     if len(df_plot) > 3:
-        z = np.polyfit(df_plot["log_count"], df_plot["dmi"], 1)
-        trend_x = np.linspace(df_plot["log_count"].min(), df_plot["log_count"].max(), 100)
-        trend_y = np.polyval(z, trend_x)
-        # R²
-        y_pred = np.polyval(z, df_plot["log_count"])
-        ss_res = np.sum((df_plot["dmi"] - y_pred) ** 2)
-        ss_tot = np.sum((df_plot["dmi"] - df_plot["dmi"].mean()) ** 2)
-        r2 = 1 - ss_res / ss_tot if ss_tot > 0 else 0
-
-        fig.add_trace(go.Scatter(
+        trend_x, trend_y, r2 = _linear_trend(
+            df_plot["log_count"].to_numpy(), df_plot["dmi"].to_numpy(),
+        )
+
+        traces.append(go.Scatter(
             x=trend_x, y=trend_y,
             mode="lines",
             name=f"R² = {r2:.2f}",
             line=dict(color=RED, dash="dash", width=2),
         ))
 
+    fig = go.Figure(data=traces, layout=BASE_LAYOUT)
     fig.update_layout(
-        **PLOTLY_LAYOUT,
         title="DMI vs. объём карточек",
         xaxis_title="log₁₀(Карточек)",
         yaxis_title="DMI",
@@ -93,29 +131,30 @@ story_col = "story_pct" if "story_pct" in df.columns else None
 awards_col = "awards_pct" if "awards_pct" in df.columns else None
 
 if story_col and awards_col:
-    fig2 = go.Figure()
-    fig2.add_trace(go.Scatter(
+    scatter_cls = go.Scattergl if len(df) > SCATTERGL_MIN_POINTS else go.Scatter
+    traces = [scatter_cls(
         x=df[story_col],
         y=df[awards_col],
         mode="markers",
         marker=dict(color=ORANGE, size=8, opacity=0.7, line=dict(width=1, color="white")),
         text=df["region"] if "region" in df.columns else None,
         hovertemplate="%{text}<br>Story: %{x:.1f}%<br>Awards: %{y:.1f}%<extra></extra>",
-    ))
+    )]
 
     df_scatter = df[[story_col, awards_col]].dropna()
     if len(df_scatter) > 3:
-        z = np.polyfit(df_scatter[story_col], df_scatter[awards_col], 1)
-        tx = np.linspace(df_scatter[story_col].min(), df_scatter[story_col].max(), 100)
-        fig2.add_trace(go.Scatter(
-            x=tx, y=np.polyval(z, tx),
+        tx, ty, _ = _linear_trend(
+            df_scatter[story_col].to_numpy(), df_scatter[awards_col].to_numpy(),
+        )
+        traces.append(go.Scatter(
+            x=tx, y=ty,
             mode="lines",
             name=f"r = {STORY_VS_AWARDS_R}",
             line=dict(color=RED, dash="dash", width=2),
         ))
 
+    fig2 = go.Figure(data=traces, layout=BASE_LAYOUT)
     fig2.update_layout(
-        **PLOTLY_LAYOUT,
         title="Доля текстов vs. доля наград по регионам",
         xaxis_title="Доля с текстом (%)",
         yaxis_title="Доля с наградами (%)",
@@ -137,21 +176,20 @@ with col1:
             nbinsx=30,
             marker_color=LIGHT_BLUE,
             hovertemplate="DMI: %{x:.3f}<br>Регионов: %{y}<extra></extra>",
-        ))
-        fig3.add_vline(
-            x=df["dmi"].mean(),
-            line_dash="dash", line_color=RED,
-            annotation_text=f"Среднее: {df['dmi'].mean():.3f}",
-            annotation_position="top right",
-        )
+        ), layout=BASE_LAYOUT)
         fig3.update_layout(
-            **PLOTLY_LAYOUT,
             title=f"Распределение DMI (Gini = {DMI_GINI})",
             xaxis_title="DMI",
             yaxis_title="Регионов",
             height=400,
             showlegend=False,
         )
+        fig3.add_vline(
+            x=df["dmi"].mean(),
+            line_dash="dash", line_color=RED,
+            annotation_text=f"Среднее: {df['dmi'].mean():.3f}",
+            annotation_position="top right",
+        )
         st.plotly_chart(fig3, use_container_width=True)
 
 with col2:
@@ -172,9 +210,9 @@ with st.expander("ℹ️ Метод"):
         "доля текстов, доля фото, доля наград, объём и др."
     )
 
-numeric_cols = [c for c in df.columns if df[c].dtype in ["float64", "float32", "int64"] and c != "count"]
+numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c]) and c != "count"]
 if len(numeric_cols) >= 3:
-    corr = df[numeric_cols].corr()
+    corr = _corr_matrix(df, numeric_cols)
 
     fig4 = go.Figure(go.Heatmap(
         z=corr.values,
@@ -185,13 +223,8 @@ if len(numeric_cols) >= 3:
         text=np.round(corr.values, 2),
         texttemplate="%{text}",
         hovertemplate="%{y} × %{x}<br>r = %{z:.3f}<extra></extra>",
-    ))
-    # FIX: xaxis/yaxis конфликтуют с PLOTLY_LAYOUT — переопределяем отдельным вызовом
-    fig4.update_layout(
-        **PLOTLY_LAYOUT,
-        title="Корреляции между компонентами",
-        height=500,
-    )
+    ), layout=BASE_LAYOUT)
+    fig4.update_layout(title="Корреляции между компонентами", height=500)
     fig4.update_xaxes(tickangle=45, tickfont=dict(size=10))
     fig4.update_yaxes(tickfont=dict(size=10))
     st.plotly_chart(fig4, use_container_width=True)
@@ -211,5 +244,12 @@ for c in ["story_pct", "photo_pct", "awards_pct"]:
 sort_col = st.selectbox("Сортировать по", available, index=available.index("dmi") if "dmi" in available else 0)
 ascending = st.checkbox("По возрастанию", value=False)
 
-df_display = df[available].sort_values(sort_col, ascending=ascending).reset_index(drop=True)
+# Числовые столбцы — argsort по одному массиву (NaN в конце при любом направлении),
+# остальные столбцы таблицы в сортировке не участвуют
+if pd.api.types.is_numeric_dtype(df[sort_col]):
+    vals = df[sort_col].to_numpy(dtype=np.float64, na_value=np.nan)
+    order = np.argsort(vals if ascending else -vals, kind="stable")
+    df_display = df[available].iloc[order].reset_index(drop=True)
+else:
+    df_display = df[available].sort_values(sort_col, ascending=ascending, kind="stable").reset_index(drop=True)
 st.dataframe(df_display, use_container_width=True, height=500, hide_index=True)
@@ -1,10 +1,11 @@
 """🔍 Поиск — полнотекстовый поиск по сэмплу 50K."""
 
+from collections import OrderedDict
+
 import streamlit as st
-import pandas as pd
 
 from config import TOTAL_CARDS, SAMPLE_SIZE, BLUE
-from data_loader import get_duckdb_connection
+from data_loader import get_duckdb_connection, has_fts_index
 
 st.title("🔍 Поиск по карточкам ветеранов")
 
@@ -25,7 +26,124 @@ if con is None:
     )
     st.stop()
 
+# ── Запросы ───────────────────────────────────────────────────────
+FTS_READY = has_fts_index(con, "soldiers")
+
+
+def has_wildcards(q: str) -> bool:
+    """Метасимволы LIKE в запросе: такой запрос всегда ищется через ILIKE."""
+    return any(c in q for c in "%_")
+
+
+def use_fts(q: str) -> bool:
+    """FTS для запросов от 3 символов без метасимволов LIKE; короткие ищем подстрокой в ФИО."""
+    return FTS_READY and len(q) > 2 and not has_wildcards(q)
+
+
+FTS_SOURCE = (
+    "(SELECT *, COALESCE(fts_main_soldiers.match_bm25(id, ?, conjunctive := 1), 0) "
+    "AS score FROM soldiers)"
+)
+
+# Условие по тексту запроса для каждого режима поиска
+TEXT_CONDITIONS = {
+    # contains по ФИО сохраняет поиск по части фамилии
+    "fts": "(score > 0 OR contains(lower(fio), ?))",
+    "fio": "contains(lower(fio), ?)",
+    # Без метасимволов LIKE хватает векторизованного contains()
+    "contains": "(contains(lower(fio), ?) OR contains(lower(story), ?))",
+    "ilike": "(fio ILIKE ? OR story ILIKE ?)",
+}
+
+# Биты маски активных фильтров
+F_REGION, F_RANK, F_YEAR = 1, 2, 4
+
+
+@st.cache_resource
+def sql_variants() -> dict:
+    """Все сочетания (режим текста, маска фильтров) → (FROM, WHERE); строятся один раз."""
+    variants = {}
+    for mode in [None, *TEXT_CONDITIONS]:
+        for mask in range(8):
+            conditions = [TEXT_CONDITIONS[mode]] if mode else []
+            if mask & F_REGION:
+                conditions.append("region = ?")
+            if mask & F_RANK:
+                conditions.append("rank = ?")
+            if mask & F_YEAR:
+                conditions.append("birth_year BETWEEN ? AND ?")
+            source = FTS_SOURCE if mode == "fts" else "soldiers"
+            variants[mode, mask] = (source, " AND ".join(conditions) if conditions else "TRUE")
+    return variants
+
+
+def build_query(q: str, region: str, rank: str, yf: int, yt: int) -> tuple[str, str, list]:
+    """Выбрать FROM и WHERE с плейсхолдерами `?` и собрать параметры к ним.
+
+    В режиме FTS источник дополняется столбцом score (BM25, 0 — нет совпадения).
+    """
+    mode, mask, params = None, 0, []
+
+    # Метасимволы % и _ проверяются первыми: шаблон ILIKE работает и при готовом FTS
+    if q and has_wildcards(q):
+        mode = "ilike"
+        params += [f"%{q}%", f"%{q}%"]
+    elif q and use_fts(q):
+        mode = "fts"
+        params += [q, q.lower()]
+    elif q and FTS_READY:
+        mode = "fio"
+        params.append(q.lower())
+    elif q:
+        mode = "contains"
+        params += [q.lower(), q.lower()]
+
+    if region != "Все регионы":
+        mask |= F_REGION
+        params.append(region)
+
+    if rank != "Все звания":
+        mask |= F_RANK
+        params.append(rank)
+
+    if yf > 1850 or yt < 1940:
+        mask |= F_YEAR
+        params += [yf, yt]
+
+    source, where_clause = sql_variants()[mode, mask]
+    return source, where_clause, params
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def count_matches(q: str, region: str, rank: str, yf: int, yt: int) -> int:
+    """Число карточек под набором фильтров (кэшируется по сигнатуре фильтров)."""
+    source, where_clause, params = build_query(q, region, rank, yf, yt)
+    sql = f"SELECT COUNT(*) FROM {source} WHERE {where_clause}"
+    return get_duckdb_connection().execute(sql, params).fetchone()[0]
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_facets() -> tuple[list[str], list[str]]:
+    """Списки для фильтров: все регионы и топ-30 званий (неизменны на время процесса)."""
+    c = get_duckdb_connection()
+    try:
+        regions = [r for (r,) in c.execute(
+            "SELECT DISTINCT region FROM soldiers WHERE region IS NOT NULL ORDER BY region"
+        ).fetchall()]
+    except Exception:
+        regions = []
+    try:
+        ranks = [r for (r,) in c.execute(
+            "SELECT rank FROM soldiers WHERE rank IS NOT NULL "
+            "GROUP BY rank ORDER BY COUNT(*) DESC LIMIT 30"
+        ).fetchall()]
+    except Exception:
+        ranks = []
+    return ["Все регионы"] + regions, ["Все звания"] + ranks
+
+
 # ── Фильтры ──────────────────────────────────────────────────────
+region_list, rank_list = get_facets()
 col1, col2, col3 = st.columns(3)
 
 with col1:
@@ -35,24 +153,9 @@ with col1:
     )
 
 with col2:
-    # Получаем уникальные регионы
-    try:
-        regions = con.execute("SELECT DISTINCT region FROM soldiers WHERE region IS NOT NULL ORDER BY region").fetchdf()
-        region_list = ["Все регионы"] + regions["region"].tolist()
-    except Exception:
-        region_list = ["Все регионы"]
     selected_region = st.selectbox("Регион", region_list)
 
 with col3:
-    # Получаем уникальные звания (топ-20)
-    try:
-        ranks = con.execute(
-            "SELECT rank, COUNT(*) AS cnt FROM soldiers WHERE rank IS NOT NULL "
-            "GROUP BY rank ORDER BY cnt DESC LIMIT 30"
-        ).fetchdf()
-        rank_list = ["Все звания"] + ranks["rank"].tolist()
-    except Exception:
-        rank_list = ["Все звания"]
     selected_rank = st.selectbox("Звание", rank_list)
 
 # Год
@@ -64,48 +167,42 @@ with col5:
 
 # ── Поиск ─────────────────────────────────────────────────────────
 PAGE_SIZE = 20
-
-if "search_page" not in st.session_state:
-    st.session_state.search_page = 0
+PREFETCH_PAGES = 5  # страниц за один запрос к DuckDB
+SEARCH_CACHE_SIZE = 8  # наборов фильтров в кэше страниц сессии
+
+# Keyset-пагинация: курсор — (ключ сортировки, id) последней строки страницы,
+# стек prev_cursors хранит курсоры предыдущих страниц для кнопки «Назад».
+if "search_cursor" not in st.session_state:
+    st.session_state.search_cursor = None
+    st.session_state.prev_cursors = []
+    st.session_state.search_filters = None
+    st.session_state.search_total = None
+    # LRU: фильтры → {курсор: строки страницы + одна строка-признак следующей}
+    st.session_state.search_cache = OrderedDict()
 
 search_clicked = st.button("🔍 Найти", type="primary")
-if search_clicked:
-    st.session_state.search_page = 0
+filters = (query_text.strip(), selected_region, selected_rank, year_from, year_to)
+if search_clicked or filters != st.session_state.search_filters:
+    st.session_state.search_cursor = None
+    st.session_state.prev_cursors = []
+    st.session_state.search_filters = filters
+    st.session_state.search_total = None
 
 if search_clicked or query_text:
-    # Построение запроса
-    conditions = []
-
-    if query_text.strip():
-        safe_query = query_text.strip().replace("'", "''")
-        conditions.append(f"(fio ILIKE '%{safe_query}%' OR story ILIKE '%{safe_query}%')")
-
-    if selected_region != "Все регионы":
-        safe_region = selected_region.replace("'", "''")
-        conditions.append(f"region = '{safe_region}'")
-
-    if selected_rank != "Все звания":
-        safe_rank = selected_rank.replace("'", "''")
-        conditions.append(f"rank = '{safe_rank}'")
-
-    # Год рождения — парсинг из строки birthday
-    # В данных birthday может быть строкой; фильтруем по LIKE для года
-    if year_from > 1850 or year_to < 1940:
-        # Пытаемся извлечь год из birthday
-        conditions.append(
-            f"TRY_CAST(REGEXP_EXTRACT(birthday, '(\\d{{4}})', 1) AS INTEGER) "
-            f"BETWEEN {year_from} AND {year_to}"
-        )
-
-    where_clause = " AND ".join(conditions) if conditions else "TRUE"
-
-    # Подсчёт
-    try:
-        count_q = f"SELECT COUNT(*) AS cnt FROM soldiers WHERE {where_clause}"
-        total = con.execute(count_q).fetchone()[0]
-    except Exception as e:
-        st.error(f"Ошибка запроса: {e}")
-        st.stop()
+    source, where_clause, where_params = build_query(*filters)
+    # FTS-выдача упорядочена по релевантности, остальная — по ФИО.
+    # Ключ сортировки не бывает NULL (score — COALESCE, пустое ФИО — ''), иначе
+    # сравнение (ключ, id) > курсор даёт NULL и строки после курсора теряются.
+    sort_expr = "-score" if use_fts(filters[0]) else "coalesce(fio, '')"
+
+    # Подсчёт — один раз на набор фильтров; клики по страницам его не повторяют
+    if st.session_state.search_total is None:
+        try:
+            st.session_state.search_total = count_matches(*filters)
+        except Exception as e:
+            st.error(f"Ошибка запроса: {e}")
+            st.stop()
+    total = st.session_state.search_total
 
     st.markdown(f"**Найдено: {total:,} карточек**".replace(",", " "))
 
@@ -117,74 +214,130 @@ if search_clicked or query_text:
     total_pages = max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
     max_pages = min(total_pages, 50)  # Ограничиваем для UX
 
-    page = st.session_state.search_page
-    offset = page * PAGE_SIZE
-
-    try:
-        select_cols = "id, fio, region, rank, birthday, death, story, awards_txt, url"
-        query = (
-            f"SELECT {select_cols} FROM soldiers "
-            f"WHERE {where_clause} "
-            f"ORDER BY fio "
-            f"LIMIT {PAGE_SIZE} OFFSET {offset}"
-        )
-        results = con.execute(query).fetchdf()
-    except Exception as e:
-        st.error(f"Ошибка запроса: {e}")
-        st.stop()
+    cursor = st.session_state.search_cursor
+    page = len(st.session_state.prev_cursors)
+
+    cache = st.session_state.search_cache
+    pages = cache.setdefault(filters, {})
+    cache.move_to_end(filters)
+    while len(cache) > SEARCH_CACHE_SIZE:
+        cache.popitem(last=False)
+
+    if cursor not in pages:
+        try:
+            # Длинные тексты режем на стороне DuckDB: в pandas уходит только видимая часть
+            select_cols = (
+                "id, fio, region, rank, birthday, death, "
+                "substr(story, 1, 2000) AS story, length(story) AS story_len, "
+                "substr(awards_txt, 1, 200) AS awards_txt, url"
+            )
+            query = (
+                f"SELECT {select_cols}, {sort_expr} AS sort_key "
+                f"FROM {source} WHERE {where_clause}"
+            )
+            params = list(where_params)
+            if cursor is not None:
+                query += f" AND ({sort_expr}, id) > (?, ?)"
+                params.extend(cursor)
+            # Сразу несколько страниц и ещё одна строка — признак следующей страницы
+            query += f" ORDER BY sort_key, id LIMIT {PAGE_SIZE * PREFETCH_PAGES + 1}"
+            batch = con.execute(query, params).fetchdf()
+        except Exception as e:
+            st.error(f"Ошибка запроса: {e}")
+            st.stop()
+
+        # Раскладываем пачку по курсорам страниц — следующие клики её не запрашивают
+        page_cursor = cursor
+        for start in range(0, PAGE_SIZE * PREFETCH_PAGES, PAGE_SIZE):
+            pages[page_cursor] = batch.iloc[start:start + PAGE_SIZE + 1]
+            if len(batch) <= start + PAGE_SIZE:
+                break
+            last = batch.iloc[start + PAGE_SIZE - 1]
+            page_cursor = (last["sort_key"], int(last["id"]))
+
+    results = pages[cursor]
+    has_next = len(results) > PAGE_SIZE
+    results = results.head(PAGE_SIZE)
 
     # Навигация по страницам
     if total_pages > 1:
         pcol1, pcol2, pcol3 = st.columns([1, 2, 1])
         with pcol1:
             if st.button("← Назад", disabled=page == 0):
-                st.session_state.search_page = max(0, page - 1)
+                st.session_state.search_cursor = st.session_state.prev_cursors.pop()
                 st.rerun()
         with pcol2:
             st.caption(f"Страница {page + 1} из {max_pages}")
         with pcol3:
-            if st.button("Вперёд →", disabled=page >= max_pages - 1):
-                st.session_state.search_page = page + 1
+            if st.button("Вперёд →", disabled=not has_next or page >= max_pages - 1):
+                last = results.iloc[-1]
+                st.session_state.prev_cursors.append(cursor)
+                st.session_state.search_cursor = (last["sort_key"], int(last["id"]))
                 st.rerun()
 
-    # ── Карточки результатов ──────────────────────────────────────
-    for _, row in results.iterrows():
-        with st.container(border=True):
-            c1, c2 = st.columns([3, 1])
-            with c1:
-                fio = row.get("fio", "—")
-                st.markdown(f"### {fio}")
-
-                details = []
-                if pd.notna(row.get("rank")) and row["rank"]:
-                    details.append(f"**Звание:** {row['rank']}")
-                if pd.notna(row.get("birthday")) and row["birthday"]:
-                    details.append(f"**Рождение:** {row['birthday']}")
-                if pd.notna(row.get("death")) and row["death"]:
-                    details.append(f"**Гибель/смерть:** {row['death']}")
-                if pd.notna(row.get("region")) and row["region"]:
-                    details.append(f"**Регион:** {row['region']}")
-                if pd.notna(row.get("awards_txt")) and row["awards_txt"]:
-                    details.append(f"**Награды:** {row['awards_txt'][:200]}")
-
-                st.markdown(" · ".join(details) if details else "Нет данных")
-
-            with c2:
-                url = row.get("url", "")
-                if pd.notna(url) and url:
-                    st.link_button("Открыть на moypolk.ru", url, use_container_width=True)
-
-            # Текст (свёрнутый)
-            story = row.get("story", "")
-            if pd.notna(story) and story:
-                with st.expander("📖 Текст карточки"):
-                    st.markdown(str(story)[:2000])
-                    if len(str(story)) > 2000:
-                        st.caption(f"... (показаны первые 2000 из {len(str(story))} символов)")
+    # ── Результаты ────────────────────────────────────────────────
+    # Одна таблица вместо контейнера с виджетами на каждую карточку
+    st.dataframe(
+        results[["fio", "rank", "birthday", "death", "region", "url"]],
+        column_config={
+            "fio": "ФИО",
+            "rank": "Звание",
+            "birthday": "Рождение",
+            "death": "Гибель/смерть",
+            "region": "Регион",
+            "url": st.column_config.LinkColumn("moypolk.ru", display_text="Открыть"),
+        },
+        hide_index=True,
+        use_container_width=True,
+    )
+
+    # Полная карточка — только по явному выбору.
+    # После tolist() пропуски — None (или NaN, отсекается проверкой v == v).
+    cols = {c: results[c].tolist() for c in results.columns}
+
+    def present(v) -> bool:
+        return v is not None and v == v and bool(v)
+
+    i = st.selectbox(
+        "Раскрыть карточку",
+        range(len(results)),
+        index=None,
+        format_func=lambda i: cols["fio"][i] if present(cols["fio"][i]) else "—",
+        placeholder="Выберите карточку из таблицы...",
+    )
+    if i is not None:
+        with st.expander(f"📖 {cols['fio'][i] if present(cols['fio'][i]) else '—'}", expanded=True):
+            details = []
+            for label, col in (
+                ("Звание", "rank"),
+                ("Рождение", "birthday"),
+                ("Гибель/смерть", "death"),
+                ("Регион", "region"),
+                ("Награды", "awards_txt"),
+            ):
+                if present(cols[col][i]):
+                    details.append(f"**{label}:** {cols[col][i]}")
+            st.markdown(" · ".join(details) if details else "Нет данных")
+
+            story = cols["story"][i]
+            if present(story):
+                st.markdown(story)
+                story_len = cols["story_len"][i]
+                if story_len > 2000:
+                    st.caption(f"... (показаны первые 2000 из {story_len} символов)")
+
+            if present(cols["url"][i]):
+                st.link_button("Открыть на moypolk.ru", cols["url"][i])
 
 else:
     st.markdown("Введите запрос и нажмите **Найти** для поиска.")
-    st.caption(
-        "Поиск поддерживает ФИО (частичное совпадение) и ключевые слова в тексте карточки. "
-        "Регистр не важен."
-    )
+    if FTS_READY:
+        st.caption(
+            "Поиск поддерживает ФИО (частичное совпадение) и ключевые слова в тексте карточки "
+            "с учётом словоформ; результаты упорядочены по релевантности. Регистр не важен."
+        )
+    else:
+        st.caption(
+            "Поиск поддерживает ФИО (частичное совпадение) и ключевые слова в тексте карточки; "
+            "результаты упорядочены по ФИО. Регистр не важен."
+        )
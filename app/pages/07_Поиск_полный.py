@@ -2,12 +2,12 @@
 
 import re
 import datetime
+from functools import lru_cache
 import streamlit as st
-import pandas as pd
 import numpy as np
 
 from config import TOTAL_CARDS, SAMPLE_SIZE, BLUE, ORANGE
-from data_loader import get_duckdb_connection, get_full_search_connection
+from data_loader import get_duckdb_connection, get_full_search_connection, has_fts_index
 
 # ── Глобальный стиль подсветки (инжектируем один раз) ─────────────
 st.html("""
@@ -46,64 +46,125 @@ if "full_search_page" not in st.session_state:
 
 # ── Вспомогательные функции ────────────────────────────────────────
 
-def highlight(text: str, query: str, max_chars: int = 4000) -> str:
-    """Обернуть все вхождения query в <mark>. Возвращает безопасный HTML."""
+@lru_cache(maxsize=64)
+def _hl_pattern(query: str) -> re.Pattern:
+    """Скомпилированный шаблон подсветки: один на запрос, а не на каждую карточку.
+
+    Без группы захвата — совпадение целиком подставляет _mark.
+    """
+    return re.compile(re.escape(query), re.IGNORECASE)
+
+
+def _mark(m: re.Match) -> str:
+    """Замена для Pattern.sub: совпадение в исходном регистре внутри <mark>."""
+    return f"<mark>{m.group()}</mark>"
+
+
+def highlight(
+    text: str, query: str, max_chars: int = 4000, total_len: int | None = None,
+    text_low: str | None = None,
+) -> str:
+    """Обернуть все вхождения query в <mark>. Возвращает безопасный HTML.
+
+    total_len — полная длина текста, если text уже обрезан в SQL;
+    text_low — text.lower(), если вызывающий уже посчитал его.
+    """
     snippet = text[:max_chars]
-    suffix = f"<br><small style='color:#757575'>…показано {max_chars} из {len(text)} символов</small>" if len(text) > max_chars else ""
+    total_len = len(text) if total_len is None else total_len
+    suffix = f"<br><small style='color:#757575'>…показано {max_chars} из {total_len} символов</small>" if total_len > max_chars else ""
     if not query or not query.strip():
         return snippet.replace("\n", "<br>") + suffix
-    escaped = re.escape(query.strip())
-    highlighted = re.sub(f"({escaped})", r"<mark>\1</mark>", snippet, flags=re.IGNORECASE)
-    return highlighted.replace("\n", "<br>") + suffix
-
-
-def compute_mattr(text: str, window: int = 50) -> float:
-    words = text.lower().split()
+    q = query.strip().lower()
+    if text_low is None or len(text_low) != len(text):
+        text_low = snippet.lower()
+    low = text_low[:max_chars]
+    if len(low) != len(snippet):
+        # Редкие символы меняют длину при lower() — смещения не совпадут, идём через regex
+        highlighted = _hl_pattern(query.strip()).sub(_mark, snippet)
+        return highlighted.replace("\n", "<br>") + suffix
+    # Поиск вхождений в строке, приведённой к нижнему регистру один раз; теги вставляются в оригинал
+    parts = []
+    i = 0
+    while (j := low.find(q, i)) >= 0:
+        parts += (snippet[i:j], "<mark>", snippet[j:j + len(q)], "</mark>")
+        i = j + len(q)
+    parts.append(snippet[i:])
+    return "".join(parts).replace("\n", "<br>") + suffix
+
+
+def compute_mattr(words: list[str], window: int = 50) -> float:
+    """MATTR по списку слов, уже приведённых к нижнему регистру."""
     if len(words) < window:
         return round(len(set(words)) / max(len(words), 1), 3)
-    ttrs = [len(set(words[i:i + window])) / window for i in range(len(words) - window + 1)]
-    return round(float(np.mean(ttrs)), 3)
-
 
-def classify_narrative(story: str) -> str:
+    # Число уникальных слов во всех окнах за O(N): слово на позиции i новое для окна,
+    # начинающегося в s, если его предыдущее вхождение prev[i] < s. Вклад i —
+    # отрезок начал окон [max(prev[i]+1, i-window+1), min(i, N-window)] через разностный массив.
+    n = len(words)
+    index = {}
+    ids = np.fromiter((index.setdefault(w, len(index)) for w in words), dtype=np.int64, count=n)
+    order = np.argsort(ids, kind="stable")
+    prev = np.full(n, -1, dtype=np.int64)
+    same = ids[order[1:]] == ids[order[:-1]]
+    prev[order[1:][same]] = order[:-1][same]
+
+    pos = np.arange(n)
+    lo = np.maximum(prev + 1, pos - window + 1)
+    hi = np.minimum(pos, n - window)
+    ok = lo <= hi
+    diff = np.zeros(n - window + 2, dtype=np.int64)
+    np.add.at(diff, lo[ok], 1)
+    np.add.at(diff, hi[ok] + 1, -1)
+    uniques = np.cumsum(diff[:-1])
+    return round(float(uniques.mean() / window), 3)
+
+
+# Маркеры нарративов: одна альтернация на группу вместо отдельного `in` на каждое слово.
+# Ищутся в тексте в нижнем регистре — без IGNORECASE.
+_FIRST_PERSON = re.compile("я помню|мой дед|моя бабушка|мой отец|мой прадед")
+_WAR = re.compile("фронт|бой|наступление|дивизия|полк")
+
+
+def classify_narrative(story: str, story_low: str | None = None) -> str:
     if not story or len(story) < 100:
         return "Формуляр"
-    s = story.lower()
-    first_person = any(w in s for w in ["я помню", "мой дед", "моя бабушка", "мой отец", "мой прадед"])
-    if first_person and len(story) > 500:
+    if story_low is None:
+        story_low = story.lower()
+    if len(story) > 500 and _FIRST_PERSON.search(story_low):
         return "Семейная история"
-    if len(story) > 1000 and any(w in s for w in ["фронт", "бой", "наступление", "дивизия", "полк"]):
+    if len(story) > 1000 and _WAR.search(story_low):
         return "Мемуар"
     return "Смешанный"
 
 
-def card_metrics(story: str) -> dict:
-    words = story.split()
+def card_metrics(story: str, story_low: str | None = None) -> dict:
+    # Один lower() на карточку: его же используют подсветка и классификация
+    if story_low is None:
+        story_low = story.lower()
+    words = story_low.split()
     return {
         "Символов": f"{len(story):,}".replace(",", "\u202f"),
         "Слов": f"{len(words):,}".replace(",", "\u202f"),
-        "Уникальных": f"{len(set(w.lower() for w in words)):,}".replace(",", "\u202f"),
-        "MATTR": compute_mattr(story),
-        "Тип": classify_narrative(story),
+        "Уникальных": f"{len(set(words)):,}".replace(",", "\u202f"),
+        "MATTR": compute_mattr(words),
+        "Тип": classify_narrative(story, story_low),
     }
 
 
 def generate_export_html(bookmarks: dict, search_query: str = "") -> str:
     """Генерирует HTML-файл с закладками, готовый для печати/сохранения как PDF."""
     today = datetime.date.today().strftime("%d.%m.%Y")
-    cards_html = ""
+    pattern = _hl_pattern(search_query.strip()) if search_query and search_query.strip() else None
+    parts = []
     for bm in bookmarks.values():
         story_excerpt = bm.get("story_excerpt", "")
-        if search_query and story_excerpt:
-            story_excerpt = re.sub(
-                f"({re.escape(search_query.strip())})", r"<mark>\1</mark>",
-                story_excerpt, flags=re.IGNORECASE,
-            )
+        if pattern and story_excerpt:
+            story_excerpt = pattern.sub(_mark, story_excerpt)
         url_html = (
             f'<p><a href="{bm["url"]}" target="_blank">Открыть карточку на сайте →</a></p>'
             if bm.get("url") else ""
         )
-        cards_html += f"""
+        parts.append(f"""
 <div class="card">
   <h2>{bm.get("fio", "—")}</h2>
   <p class="meta">
@@ -113,7 +174,8 @@ def generate_export_html(bookmarks: dict, search_query: str = "") -> str:
   </p>
   <p class="excerpt">{story_excerpt or "<em>текст недоступен</em>"}</p>
   {url_html}
-</div>"""
+</div>""")
+    cards_html = "".join(parts)
 
     return f"""<!DOCTYPE html>
 <html lang="ru">
@@ -169,6 +231,154 @@ else:
     )
     st.stop()
 
+# FTS-индекс (BM25, стемминг) строится вместе с таблицей, если доступно расширение fts
+FTS_READY = has_fts_index(con, table)
+
+PAGE_SIZE = 12
+STORY_CLIP = 4000  # столько символов текста показывается в карточке
+SELECT_COLS = "id, fio, region, rank, birthday, death, awards_txt, url, length(story) AS story_len"
+
+
+def _connection(table: str):
+    """Соединение по имени таблицы (cache_resource — одно на процесс)."""
+    return get_full_search_connection() if table == "soldiers_full" else get_duckdb_connection()
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_facets(table: str) -> tuple[list[str], list[str]]:
+    """Списки для фильтров: все регионы и топ-30 званий (неизменны на время процесса)."""
+    c = _connection(table)
+    try:
+        regions = [r for (r,) in c.execute(
+            f"SELECT DISTINCT region FROM {table} WHERE region IS NOT NULL ORDER BY region"
+        ).fetchall()]
+    except Exception:
+        regions = []
+    try:
+        ranks = [r for (r,) in c.execute(
+            f"SELECT rank FROM {table} WHERE rank IS NOT NULL "
+            "GROUP BY rank ORDER BY COUNT(*) DESC LIMIT 30"
+        ).fetchall()]
+    except Exception:
+        ranks = []
+    return ["Все регионы"] + regions, ["Все звания"] + ranks
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def count_matches(table: str, where_clause: str, params: tuple) -> int:
+    """Число карточек под фильтрами: не пересчитывается при листании и закладках."""
+    sql = f"SELECT COUNT(*) FROM {table} WHERE {where_clause}"
+    return _connection(table).execute(sql, list(params)).fetchone()[0]
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def fetch_page(
+    table: str, where_clause: str, params: tuple, offset: int, full_story: bool = False,
+) -> list[dict]:
+    """Одна страница результатов (PAGE_SIZE карточек, по ФИО).
+
+    Текст обрезается до STORY_CLIP прямо в SQL; целиком — только для метрик карточки.
+    """
+    story = "story" if full_story else f"substr(story, 1, {STORY_CLIP}) AS story"
+    sql = (
+        f"SELECT {SELECT_COLS}, {story} FROM {table} WHERE {where_clause} "
+        "ORDER BY fio LIMIT ? OFFSET ?"
+    )
+    # Строки страницы — сразу словарями, без промежуточного DataFrame.
+    # NULL — пустые строки: в карточке достаточно проверки на истинность.
+    cur = _connection(table).execute(sql, [*params, PAGE_SIZE, offset])
+    cols = [d[0] for d in cur.description]
+    return [
+        {c: "" if v is None else v for c, v in zip(cols, values)}
+        for values in cur.fetchall()
+    ]
+
+
+def _toggle_bookmark(card_id: str, entry: dict) -> None:
+    """Добавить карточку в закладки или убрать её оттуда (on_click кнопки ☆)."""
+    if card_id in st.session_state.bookmarks:
+        del st.session_state.bookmarks[card_id]
+    else:
+        st.session_state.bookmarks[card_id] = entry
+
+
+@st.fragment
+def _render_card(row: dict, hl_query: str, page: int, show_metrics: bool) -> None:
+    """Карточка результата. Фрагмент: клик ☆ перерисовывает только её,
+    без повторного запроса и пересчёта метрик остальных карточек.
+    Список закладок в sidebar обновится при следующем полном перезапуске.
+    """
+    card_id = str(row["id"])
+    is_bookmarked = card_id in st.session_state.bookmarks
+
+    with st.container(border=True):
+        # ── Заголовок карточки ──────────────────────────────────
+        hdr_col, act_col = st.columns([5, 1])
+
+        with hdr_col:
+            fio = row["fio"] or "ФИО не указано"
+            # Если поиск был по ФИО — подсвечиваем его в заголовке
+            hl_fio, n_hits = _hl_pattern(hl_query).subn(_mark, fio) if hl_query else (fio, 0)
+            if n_hits:
+                st.html(f"<h3 style='margin:0 0 4px 0'>{hl_fio}</h3>")
+            else:
+                st.markdown(f"### {fio}")
+
+        with act_col:
+            bm_label = "⭐" if is_bookmarked else "☆"
+            bm_help = "Удалить из закладок" if is_bookmarked else "Добавить в закладки"
+            entry = {
+                "fio": fio,
+                "region": row["region"],
+                "rank": row["rank"],
+                "url": row["url"],
+                "story_excerpt": row["story"][:400],
+            }
+            st.button(
+                bm_label, key=f"bm_{card_id}_{page}", help=bm_help,
+                on_click=_toggle_bookmark, args=(card_id, entry),
+            )
+
+            if row["url"]:
+                st.link_button("↗", row["url"], help="Открыть карточку на сайте")
+
+        # ── Метаданные (чипы) ───────────────────────────────────
+        chips = []
+        if row["rank"]:
+            chips.append(f"🎖️ {row['rank']}")
+        if row["birthday"] or row["death"]:
+            chips.append(f"📅 {row['birthday'] or '?'} — {row['death'] or '?'}")
+        if row["region"]:
+            chips.append(f"📍 {row['region']}")
+        if chips:
+            chips_html = "".join(
+                f'<span class="meta-chip">{c}</span>' for c in chips
+            )
+            st.html(f'<div style="margin-bottom:4px">{chips_html}</div>')
+
+        # Награды (если есть)
+        if row["awards_txt"]:
+            st.caption(f"🏅 {row['awards_txt'][:200]}")
+
+        # ── Текст карточки с подсветкой ─────────────────────────
+        story = row["story"]
+        if story:
+            story_low = story.lower()
+            with st.expander("📖 Текст карточки", expanded=False):
+                hl_html = highlight(
+                    story, hl_query, max_chars=STORY_CLIP, total_len=int(row["story_len"]),
+                    text_low=story_low,
+                )
+                st.html(f'<div class="card-text">{hl_html}</div>')
+
+            # ── Метрики (опционально) ────────────────────────────
+            if show_metrics:
+                m = card_metrics(story, story_low)
+                metric_cols = st.columns(len(m))
+                for mc, (k, v) in zip(metric_cols, m.items()):
+                    mc.metric(k, v)
+
+
 # ── Закладки (sidebar) ─────────────────────────────────────────────
 with st.sidebar:
     st.markdown("### ⭐ Закладки")
@@ -192,20 +402,28 @@ with st.sidebar:
         )
         st.markdown("---")
 
-        for bm_id, bm in list(st.session_state.bookmarks.items()):
-            with st.expander(f"📌 {(bm.get('fio') or '—')[:35]}"):
-                if bm.get("rank"):
-                    st.caption(f"🎖️ {bm['rank']}")
-                if bm.get("region"):
-                    st.caption(f"📍 {bm['region']}")
-                excerpt = bm.get("story_excerpt", "")
-                if excerpt:
-                    st.markdown(f"_{excerpt[:180]}…_" if len(excerpt) > 180 else f"_{excerpt}_")
-                if bm.get("url"):
-                    st.link_button("Открыть ↗", bm["url"])
-                if st.button("🗑 Удалить", key=f"del_{bm_id}", use_container_width=True):
-                    del st.session_state.bookmarks[bm_id]
-                    st.rerun()
+        # Список строится, только если включён: expander не ленив, а при сотне закладок
+        # это сотни виджетов на каждый перезапуск (листание, ввод запроса)
+        if st.toggle("Показать закладки", key="show_bookmarks"):
+            # Удаление — после обхода: словарь не меняется во время итерации и не копируется
+            to_delete = []
+            for bm_id, bm in st.session_state.bookmarks.items():
+                with st.expander(f"📌 {(bm.get('fio') or '—')[:35]}"):
+                    if bm.get("rank"):
+                        st.caption(f"🎖️ {bm['rank']}")
+                    if bm.get("region"):
+                        st.caption(f"📍 {bm['region']}")
+                    excerpt = bm.get("story_excerpt", "")
+                    if excerpt:
+                        st.markdown(f"_{excerpt[:180]}…_" if len(excerpt) > 180 else f"_{excerpt}_")
+                    if bm.get("url"):
+                        st.link_button("Открыть ↗", bm["url"])
+                    if st.button("🗑 Удалить", key=f"del_{bm_id}", use_container_width=True):
+                        to_delete.append(bm_id)
+            for bm_id in to_delete:
+                st.session_state.bookmarks.pop(bm_id, None)
+            if to_delete:
+                st.rerun()
 
         st.markdown("---")
         if st.button("Очистить все закладки", type="secondary", use_container_width=True):
@@ -213,6 +431,7 @@ with st.sidebar:
             st.rerun()
 
 # ── Панель фильтров ────────────────────────────────────────────────
+region_list, rank_list = get_facets(table)
 with st.container(border=True):
     col1, col2, col3 = st.columns([3, 1, 1])
 
@@ -224,24 +443,9 @@ with st.container(border=True):
         )
 
     with col2:
-        try:
-            regions = con.execute(
-                f"SELECT DISTINCT region FROM {table} WHERE region IS NOT NULL ORDER BY region"
-            ).fetchdf()
-            region_list = ["Все регионы"] + regions["region"].tolist()
-        except Exception:
-            region_list = ["Все регионы"]
         selected_region = st.selectbox("Регион", region_list, key="full_region")
 
     with col3:
-        try:
-            ranks = con.execute(
-                f"SELECT rank, COUNT(*) AS cnt FROM {table} WHERE rank IS NOT NULL "
-                f"GROUP BY rank ORDER BY cnt DESC LIMIT 30"
-            ).fetchdf()
-            rank_list = ["Все звания"] + ranks["rank"].tolist()
-        except Exception:
-            rank_list = ["Все звания"]
         selected_rank = st.selectbox("Звание", rank_list, key="full_rank")
 
     col4, col5, col6 = st.columns([1, 1, 2])
@@ -262,33 +466,45 @@ if search_clicked:
     st.session_state.full_search_page = 0
 
 # ── Поисковый запрос ───────────────────────────────────────────────
-PAGE_SIZE = 12
-
 if search_clicked or query_text or selected_region != "Все регионы" or selected_rank != "Все звания":
     conditions = []
+    params = []
 
-    if query_text.strip():
-        safe_q = query_text.strip().replace("'", "''")
-        conditions.append(f"(fio ILIKE '%{safe_q}%' OR story ILIKE '%{safe_q}%')")
+    q = query_text.strip()
+    # Метасимволы % и _ — шаблон ILIKE и при готовом FTS, как на странице сэмпла
+    wildcards = any(c in q for c in "%_")
+    if q and FTS_READY and len(q) > 2 and not wildcards:
+        # Индекс вместо сканирования story; contains по ФИО сохраняет поиск по части фамилии
+        conditions.append(
+            f"(fts_main_{table}.match_bm25(id, ?, conjunctive := 1) IS NOT NULL "
+            "OR contains(lower(fio), ?))"
+        )
+        params += [q, q.lower()]
+    elif q and FTS_READY and not wildcards:
+        # Короткие запросы — подстрокой только в ФИО, как на странице сэмпла
+        conditions.append("contains(lower(fio), ?)")
+        params.append(q.lower())
+    elif q:
+        conditions.append("(fio ILIKE ? OR story ILIKE ?)")
+        params += [f"%{q}%", f"%{q}%"]
 
     if selected_region != "Все регионы":
-        safe_r = selected_region.replace("'", "''")
-        conditions.append(f"region = '{safe_r}'")
+        conditions.append("region = ?")
+        params.append(selected_region)
 
     if selected_rank != "Все звания":
-        safe_rk = selected_rank.replace("'", "''")
-        conditions.append(f"rank = '{safe_rk}'")
+        conditions.append("rank = ?")
+        params.append(selected_rank)
 
     if year_from > 1850 or year_to < 1940:
-        conditions.append(
-            f"TRY_CAST(REGEXP_EXTRACT(birthday, '(\\d{{4}})', 1) AS INTEGER) "
-            f"BETWEEN {year_from} AND {year_to}"
-        )
+        # birth_year материализован при загрузке — целочисленное сравнение без regex
+        conditions.append("birth_year BETWEEN ? AND ?")
+        params += [int(year_from), int(year_to)]
 
     where_clause = " AND ".join(conditions) if conditions else "story IS NOT NULL"
 
     try:
-        total = con.execute(f"SELECT COUNT(*) FROM {table} WHERE {where_clause}").fetchone()[0]
+        total = count_matches(table, where_clause, tuple(params))
     except Exception as e:
         st.error(f"Ошибка запроса: {e}")
         st.stop()
@@ -331,93 +547,16 @@ if search_clicked or query_text or selected_region != "Все регионы" or
     _render_pagination("top")
 
     # ── Результаты ─────────────────────────────────────────────────
-    select_cols = "id, fio, region, rank, birthday, death, story, awards_txt, url"
     try:
-        results = con.execute(
-            f"SELECT {select_cols} FROM {table} WHERE {where_clause} "
-            f"ORDER BY fio LIMIT {PAGE_SIZE} OFFSET {offset}"
-        ).fetchdf()
+        results = fetch_page(table, where_clause, tuple(params), offset, full_story=show_metrics)
     except Exception as e:
         st.error(f"Ошибка выборки: {e}")
         st.stop()
 
     hl_query = query_text.strip() if query_text else ""
 
-    for _, row in results.iterrows():
-        card_id = str(row.get("id", id(row)))
-        is_bookmarked = card_id in st.session_state.bookmarks
-
-        with st.container(border=True):
-            # ── Заголовок карточки ──────────────────────────────────
-            hdr_col, act_col = st.columns([5, 1])
-
-            with hdr_col:
-                fio = row.get("fio") or "ФИО не указано"
-                # Если поиск был по ФИО — подсвечиваем его в заголовке
-                if hl_query and re.search(re.escape(hl_query), fio, re.IGNORECASE):
-                    hl_fio = re.sub(
-                        f"({re.escape(hl_query)})", r"<mark>\1</mark>",
-                        fio, flags=re.IGNORECASE,
-                    )
-                    st.html(f"<h3 style='margin:0 0 4px 0'>{hl_fio}</h3>")
-                else:
-                    st.markdown(f"### {fio}")
-
-            with act_col:
-                bm_label = "⭐" if is_bookmarked else "☆"
-                bm_help = "Удалить из закладок" if is_bookmarked else "Добавить в закладки"
-                if st.button(bm_label, key=f"bm_{card_id}_{page}", help=bm_help):
-                    if is_bookmarked:
-                        del st.session_state.bookmarks[card_id]
-                    else:
-                        story_val = str(row.get("story") or "")
-                        st.session_state.bookmarks[card_id] = {
-                            "fio": fio,
-                            "region": row.get("region") or "",
-                            "rank": row.get("rank") or "",
-                            "url": row.get("url") or "",
-                            "story_excerpt": story_val[:400],
-                        }
-                    st.rerun()
-
-                url = row.get("url") or ""
-                if pd.notna(url) and url:
-                    st.link_button("↗", url, help="Открыть карточку на сайте")
-
-            # ── Метаданные (чипы) ───────────────────────────────────
-            chips = []
-            if pd.notna(row.get("rank")) and row["rank"]:
-                chips.append(f"🎖️ {row['rank']}")
-            bd = row.get("birthday") or ""
-            dt = row.get("death") or ""
-            if bd or dt:
-                chips.append(f"📅 {bd or '?'} — {dt or '?'}")
-            if pd.notna(row.get("region")) and row["region"]:
-                chips.append(f"📍 {row['region']}")
-            if chips:
-                chips_html = "".join(
-                    f'<span class="meta-chip">{c}</span>' for c in chips
-                )
-                st.html(f'<div style="margin-bottom:4px">{chips_html}</div>')
-
-            # Награды (если есть)
-            awards = str(row.get("awards_txt") or "")
-            if awards and awards != "nan":
-                st.caption(f"🏅 {awards[:200]}")
-
-            # ── Текст карточки с подсветкой ─────────────────────────
-            story = str(row.get("story") or "")
-            if story and story != "nan":
-                with st.expander("📖 Текст карточки", expanded=False):
-                    hl_html = highlight(story, hl_query, max_chars=4000)
-                    st.html(f'<div class="card-text">{hl_html}</div>')
-
-                # ── Метрики (опционально) ────────────────────────────
-                if show_metrics:
-                    m = card_metrics(story)
-                    metric_cols = st.columns(len(m))
-                    for mc, (k, v) in zip(metric_cols, m.items()):
-                        mc.metric(k, v)
+    for row in results:
+        _render_card(row, hl_query, page, show_metrics)
 
     # ── Пагинация внизу ─────────────────────────────────────────
     _render_pagination("bottom")
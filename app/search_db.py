@@ -0,0 +1,102 @@
+"""Сборка файла полной базы поиска (soldiers_full.duckdb) из parquet-чанков.
+
+Без зависимости от Streamlit: используется и приложением (data_loader),
+и скриптом подготовки данных (scripts/prepare_data.py).
+"""
+
+import os
+import pathlib
+
+import duckdb
+
+
+# Версия схемы базы: при несовпадении файл пересобирается.
+# 2 — добавлен столбец birth_year; 3 — в search_meta записывается fts_ready.
+FULL_SEARCH_SCHEMA = 3
+
+# Год рождения из строки birthday — один раз при сборке, а не regex в каждом запросе
+BIRTH_YEAR_SQL = "TRY_CAST(REGEXP_EXTRACT(birthday, '(\\d{4})', 1) AS SMALLINT) AS birth_year"
+
+# Ограничения DuckDB и для сборки, и для чтения: сборка в приложении идёт
+# на том же сервере, что и обслуживание страниц
+MEMORY_LIMIT = "512MB"
+THREADS = 2
+
+
+def configure(con: duckdb.DuckDBPyConnection) -> None:
+    """Лимит памяти и потоков для соединения с базой поиска."""
+    con.execute(f"SET memory_limit = '{MEMORY_LIMIT}'")
+    con.execute(f"SET threads = {THREADS}")
+
+
+def load_fts(con: duckdb.DuckDBPyConnection) -> bool:
+    """Установить и загрузить расширение fts; False — недоступно (например, нет сети)."""
+    try:
+        con.execute("INSTALL fts; LOAD fts;")
+    except duckdb.Error:
+        return False
+    return True
+
+
+def read_meta(db_path: pathlib.Path) -> tuple[int, bool]:
+    """(версия схемы, построен ли FTS-индекс); (0, False) — файла нет или он старого формата."""
+    if not db_path.exists():
+        return 0, False
+    try:
+        with duckdb.connect(str(db_path), read_only=True) as con:
+            version, fts_ready = con.execute(
+                "SELECT schema_version, fts_ready FROM search_meta"
+            ).fetchone()
+    except duckdb.Error:
+        return 0, False
+    return version, bool(fts_ready)
+
+
+def needs_rebuild(db_path: pathlib.Path, sources: list[pathlib.Path]) -> bool:
+    """Пересобирать ли базу: нет файла, parquet новее, другая схема
+    или индекс не был построен, а расширение fts теперь загружается."""
+    if not db_path.exists() or db_path.stat().st_mtime < max(p.stat().st_mtime for p in sources):
+        return True
+    version, fts_ready = read_meta(db_path)
+    if version != FULL_SEARCH_SCHEMA:
+        return True
+    if not fts_ready:
+        with duckdb.connect(":memory:") as con:
+            return load_fts(con)
+    return False
+
+
+def build_full_search_db(sources: list[pathlib.Path], db_path: pathlib.Path) -> bool:
+    """Собрать базу из parquet: таблица, FTS-индекс, статистика, search_meta.
+
+    Пишется во временный файл и переименовывается — читатели не увидят
+    недостроенную базу. Возвращает, построен ли FTS-индекс.
+    """
+    tmp = db_path.with_name(f"{db_path.name}.{os.getpid()}.tmp")
+    tmp.unlink(missing_ok=True)
+    files = ", ".join(f"'{p}'" for p in sources)
+    con = duckdb.connect(str(tmp))
+    try:
+        configure(con)
+        con.execute("SET enable_progress_bar = false")
+        con.execute(
+            f"CREATE TABLE soldiers_full AS SELECT *, {BIRTH_YEAR_SQL} FROM read_parquet([{files}])"
+        )
+        fts_ready = load_fts(con)
+        if fts_ready:
+            try:
+                con.execute(
+                    "PRAGMA create_fts_index('soldiers_full', 'id', 'fio', 'story', "
+                    "stemmer='russian', stopwords='none')"
+                )
+            except duckdb.Error:
+                fts_ready = False
+        con.execute("ANALYZE")
+        con.execute(
+            "CREATE TABLE search_meta AS SELECT ? AS schema_version, ? AS fts_ready",
+            [FULL_SEARCH_SCHEMA, fts_ready],
+        )
+    finally:
+        con.close()
+    tmp.replace(db_path)
+    return fts_ready
@@ -11,15 +11,21 @@
 Результат:
     data/aggregated/*.parquet  (~1 MB суммарно)
     data/sample/soldiers_sample_50k.parquet (~80 MB)
+    data/full/soldiers_fts_part*.parquet + soldiers_full.duckdb (база поиска, в git не попадает)
 """
 
 import argparse
+import csv
 import sys
 import warnings
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 
@@ -28,6 +34,7 @@ ROOT = Path(__file__).resolve().parent.parent
 AGG_DIR = ROOT / "data" / "aggregated"
 SAMPLE_DIR = ROOT / "data" / "sample"
 FULL_DIR = ROOT / "data" / "full"
+CACHE_DIR = ROOT / "data" / "_cache"  # Parquet-копия исходного CSV, в git не попадает
 
 AGG_DIR.mkdir(parents=True, exist_ok=True)
 SAMPLE_DIR.mkdir(parents=True, exist_ok=True)
@@ -38,58 +45,238 @@ def log(msg: str):
     print(f"[prepare] {msg}", flush=True)
 
 
+def _write(df: pd.DataFrame, path: Path, compression: str = "zstd", level: int = 3, **kwargs):
+    """Запись Parquet без индекса; все выходные файлы — zstd одного уровня.
+
+    Словарное кодирование pyarrow включает сам (use_dictionary=True по умолчанию).
+    """
+    df.to_parquet(path, index=False, compression=compression, compression_level=level, **kwargs)
+
+
 # ═══════════════════════════════════════════════════════════════════
 # Вспомогательные функции
 # ═══════════════════════════════════════════════════════════════════
 
+# Текстовые столбцы читаются строками без автоопределения типа
+# (иначе столбец из одних годов, например birthday, станет числовым)
+TEXT_COLUMNS = [
+    "url", "fio", "story", "region", "rank", "birthday", "death", "awards_txt",
+    "pub_date", "battles", "birthplace", "added_region",
+]
+# Повторяющиеся короткие строки — словарный тип Arrow (в pandas — category):
+# группировки по кодам, а не по хэшам строк
+DICT_COLUMNS = ["region", "rank", "birthplace", "added_region"]
+# Всё, что читают агрегаты, сэмпл и FTS; прочие столбцы CSV не загружаются
+USED_COLUMNS = ["id", "photos_cnt", "awards_cnt", *TEXT_COLUMNS]
+
+
+def load_raw(input_path: Path) -> pd.DataFrame:
+    """Прочитать исходный CSV многопоточным парсером PyArrow.
+
+    Первый запуск сохраняет таблицу в data/_cache/<имя>.parquet (zstd);
+    следующие читают Parquet, пока CSV не изменится.
+    Читаются только USED_COLUMNS, присутствующие в файле.
+    """
+    cache = CACHE_DIR / f"{input_path.stem}.parquet"
+    if cache.exists() and cache.stat().st_mtime >= input_path.stat().st_mtime:
+        log(f"Чтение кэша {cache.relative_to(ROOT)}...")
+        present = set(pq.read_schema(cache).names)
+        columns = [c for c in USED_COLUMNS if c in present]
+        return _sorted_categories(pq.read_table(cache, columns=columns).to_pandas())
+
+    log(f"Чтение {input_path}...")
+    with open(input_path, encoding="utf-8-sig", newline="") as f:
+        header = next(csv.reader(f))
+    table = pacsv.read_csv(
+        input_path,
+        read_options=pacsv.ReadOptions(block_size=64 << 20, use_threads=True),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=[c for c in USED_COLUMNS if c in header],
+            column_types={
+                **{c: pa.string() for c in TEXT_COLUMNS},
+                **{c: pa.dictionary(pa.int32(), pa.string()) for c in DICT_COLUMNS},
+                # Узкие целые: id < 2³¹, счётчики фото/наград — единицы
+                "id": pa.int32(),
+                "photos_cnt": pa.int16(),
+                "awards_cnt": pa.int16(),
+            },
+            strings_can_be_null=True,
+        ),
+    )
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, cache, compression="zstd")
+    log(f"Кэш сохранён: {cache.relative_to(ROOT)}")
+    return _sorted_categories(table.to_pandas())
+
+
+def _sorted_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """DICT_COLUMNS как category с отсортированными категориями.
+
+    Словарь Arrow хранит значения в порядке появления; сортировка категорий
+    сохраняет алфавитный порядок групп в агрегатах.
+    """
+    for col in DICT_COLUMNS:
+        if col not in df.columns:
+            continue
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].cat.reorder_categories(sorted(df[col].cat.categories))
+        else:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def add_pub_date_columns(df: pd.DataFrame) -> None:
+    """Разобрать pub_date один раз: pub_date_dt, pub_year (Int16), pub_month («ГГГГ-ММ»).
+
+    Все агрегаты по дате публикации берут готовые столбцы.
+    """
+    df["pub_date_dt"] = pd.to_datetime(df["pub_date"], format="ISO8601", errors="coerce")
+    df["pub_year"] = df["pub_date_dt"].dt.year.astype("Int16")
+    df["pub_month"] = df["pub_date_dt"].dt.strftime("%Y-%m").astype("category")
+
+
+# Группировка званий: ключевые слова как regex-альтернации (в порядке приоритета)
+OFFICER_RE = "лейтенант|капитан|майор|полковник|генерал|маршал|командир"
+NCO_RE = "сержант|старшина|ефрейтор"
+PRIVATE_RE = "рядовой|красноармеец|солдат"
+
+
+def rank_groups(rank: pd.Series) -> pd.Categorical:
+    """Категория звания (Офицеры, Сержанты/старшины, Рядовые, Другие, Неизвестно) — векторно."""
+    r = rank.str.lower()
+    conditions = [
+        rank.isna().to_numpy(),
+        r.str.contains(OFFICER_RE, regex=True, na=False).to_numpy(dtype=bool),
+        r.str.contains(NCO_RE, regex=True, na=False).to_numpy(dtype=bool),
+        r.str.contains(PRIVATE_RE, regex=True, na=False).to_numpy(dtype=bool),
+    ]
+    choices = ["Неизвестно", "Офицеры", "Сержанты/старшины", "Рядовые"]
+    return pd.Categorical(np.select(conditions, choices, default="Другие"))
+
+
+def add_flag_columns(df: pd.DataFrame) -> None:
+    """Признаки наличия текста/фото/наград как int8: агрегаты считают их встроенными sum/mean.
+
+    Заодно _story_len (int32, 0 без текста) — длина считается один раз на прогон.
+    """
+    df["_has_story"] = df["story"].notna().astype("int8")
+    df["_story_len"] = df["story"].str.len().fillna(0).astype("int32")
+    df["_has_photo"] = (df["photos_cnt"] > 0).astype("int8")
+    df["_has_awards"] = (df["awards_cnt"] > 0).astype("int8")
+
+
+def add_region_pair_columns(df: pd.DataFrame) -> None:
+    """birth_region / submit_region для миграции и сети связей — один раз на прогон.
+
+    Источник: birthplace и added_region (иначе region). Длинные строки чистим —
+    берём первую часть до запятой, как регион. Чистка идёт по категориям,
+    а не по строкам; оба столбца получают общий набор категорий, чтобы их
+    можно было сравнивать.
+    """
+    birth_src = "birthplace" if "birthplace" in df.columns else "region"
+    submit_src = "added_region" if "added_region" in df.columns else "region"
+    birth = df[birth_src].astype("category")
+    submit = df[submit_src].astype("category")
+    # Первая часть до запятой без пробелов — строковые ядра Arrow, без Python-объектов
+    norm = []
+    for s in (birth, submit):
+        cats = pa.array(s.cat.categories.astype(str), type=pa.string())
+        head = pc.list_element(pc.split_pattern(cats, pattern=",", max_splits=1), 0)
+        norm.append(pc.utf8_trim_whitespace(head).to_numpy(zero_copy_only=False))
+    categories = pd.Index(np.union1d(norm[0], norm[1]))
+    for col, s, cats in zip(["birth_region", "submit_region"], [birth, submit], norm):
+        # Код -1 (пропуск) указывает на добавленный в конец -1 — работает и без категорий
+        remap = np.append(categories.get_indexer(cats), -1)
+        df[col] = pd.Categorical.from_codes(remap[s.cat.codes.to_numpy()], categories)
+
+
 def parse_year_from_str(series: pd.Series) -> pd.Series:
-    """Извлечь 4-значный год из строки (birthday, death и т.д.)."""
-    return series.astype(str).str.extract(r"(\d{4})", expand=False).astype(float)
+    """Извлечь 4-значный год из строки (birthday, death и т.д.).
 
+    Regex-ядро Arrow по всему столбцу; без совпадения или при пропуске — NaN.
+    float32: четырёхзначные годы представимы точно, памяти вдвое меньше.
+    """
+    if not pd.api.types.is_string_dtype(series):
+        series = series.astype(str)
+    arr = pa.array(series, type=pa.string(), from_pandas=True)
+    years = pc.struct_field(pc.extract_regex(arr, r"(?P<year>\d{4})"), [0])
+    return pd.Series(
+        pc.cast(years, pa.float32()).to_numpy(zero_copy_only=False), index=series.index,
+    )
 
-def classify_narrative(row) -> str:
-    """Классифицировать текст карточки на 4 типа нарратива."""
-    story = str(row.get("story", ""))
-    length = len(story)
 
-    if length < 100:
-        return "Формуляр"
+# Маркеры повествования от первого лица — одна альтернация для векторного поиска
+FIRST_PERSON_RE = "я помню|мой дед|моя бабушка|наш|мой отец|мой прадед"
 
-    # Простые маркеры
-    first_person = any(w in story.lower() for w in ["я помню", "мой дед", "моя бабушка", "наш", "мой отец", "мой прадед"])
-    has_dates = bool(pd.notna(row.get("birthday"))) and bool(pd.notna(row.get("death")))
-    has_battles = bool(pd.notna(row.get("battles"))) and len(str(row.get("battles", ""))) > 5
 
-    if first_person and length > 500:
-        return "Семейная история"
-    elif length > 1000 and has_battles:
-        return "Мемуар"
-    elif first_person or length > 300:
-        return "Смешанный"
+def classify_narratives(df: pd.DataFrame) -> pd.Categorical:
+    """Классифицировать тексты карточек на 4 типа нарратива (векторно, без apply по строкам).
+
+    Длина текста — готовый столбец _story_len (см. add_flag_columns).
+    """
+    length = df["_story_len"].to_numpy()
+    first_person = df["story"].str.contains(
+        FIRST_PERSON_RE, case=False, regex=True, na=False,
+    ).to_numpy(dtype=bool)
+    if "battles" in df.columns:
+        has_battles = (df["battles"].fillna("").str.len() > 5).to_numpy(dtype=bool)
     else:
-        return "Формуляр"
+        has_battles = np.zeros(len(df), dtype=bool)
+
+    conditions = [
+        length < 100,
+        first_person & (length > 500),
+        (length > 1000) & has_battles,
+        first_person | (length > 300),
+    ]
+    choices = ["Формуляр", "Семейная история", "Мемуар", "Смешанный"]
+    return pd.Categorical(np.select(conditions, choices, default="Формуляр"))
 
 
-def compute_mattr(text: str, window: int = 50) -> float:
-    """Moving-Average Type-Token Ratio."""
-    words = text.lower().split()
-    if len(words) < window:
-        return len(set(words)) / max(len(words), 1)
-    ttrs = []
-    for i in range(len(words) - window + 1):
-        chunk = words[i : i + window]
-        ttrs.append(len(set(chunk)) / window)
-    return np.mean(ttrs)
+def compute_mattr(words: list[str], window: int = 50) -> float:
+    """Moving-Average Type-Token Ratio за O(N), без множества на каждое окно.
+
+    Принимает уже токенизированный текст (слова в нижнем регистре).
+    Слово на позиции i новое для окна, начинающегося в s, если его предыдущее
+    вхождение prev[i] < s. Вклад i — отрезок начал окон
+    [max(prev[i]+1, i-window+1), min(i, N-window)], суммируется разностным массивом.
+    """
+    n = len(words)
+    if n < window:
+        return len(set(words)) / max(n, 1)
+
+    vocab = {}
+    ids = np.fromiter((vocab.setdefault(w, len(vocab)) for w in words), dtype=np.int64, count=n)
+    order = np.argsort(ids, kind="stable")
+    prev = np.full(n, -1, dtype=np.int64)
+    same = ids[order[1:]] == ids[order[:-1]]
+    prev[order[1:][same]] = order[:-1][same]
+
+    pos = np.arange(n)
+    lo = np.maximum(prev + 1, pos - window + 1)
+    hi = np.minimum(pos, n - window)
+    ok = lo <= hi
+    diff = np.zeros(n - window + 2, dtype=np.int64)
+    np.add.at(diff, lo[ok], 1)
+    np.add.at(diff, hi[ok] + 1, -1)
+    return float(np.cumsum(diff[:-1]).mean() / window)
 
 
 def gini(array):
-    """Коэффициент Джини."""
-    arr = np.sort(np.array(array, dtype=float))
-    n = len(arr)
-    if n == 0 or arr.sum() == 0:
+    """Коэффициент Джини через кривую Лоренца.
+
+    Σ cumsum = (n+1)·S − Σ i·x_i, поэтому G = ((n+1)·S − 2·Σ cumsum) / (n·S):
+    без массива индексов и поэлементного произведения.
+    """
+    arr = np.sort(np.asarray(array, dtype=np.float64))
+    n = arr.size
+    if n == 0:
+        return 0.0
+    cum = arr.cumsum()
+    total = cum[-1]
+    if total == 0:
         return 0.0
-    index = np.arange(1, n + 1)
-    return (2 * np.sum(index * arr) - (n + 1) * np.sum(arr)) / (n * np.sum(arr))
+    return float(((n + 1) * total - 2 * cum.sum()) / (n * total))
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -98,83 +285,65 @@ def gini(array):
 
 def make_monthly_counts(df: pd.DataFrame):
     log("monthly_counts...")
-    df["pub_month"] = pd.to_datetime(df["pub_date"], errors="coerce").dt.to_period("M")
-    counts = df.groupby("pub_month").size().reset_index(name="count")
+    counts = df.groupby("pub_month", observed=True).size().reset_index(name="count")
     counts["month"] = counts["pub_month"].astype(str)
-    counts[["month", "count"]].to_parquet(AGG_DIR / "monthly_counts.parquet", index=False)
+    _write(counts[["month", "count"]], AGG_DIR / "monthly_counts.parquet")
 
 
 def make_yearly_stats(df: pd.DataFrame):
     log("yearly_stats...")
-    df["pub_year"] = pd.to_datetime(df["pub_date"], errors="coerce").dt.year
     yearly = df.groupby("pub_year").agg(
         total=("id", "count"),
-        with_story=("story", lambda x: x.notna().sum()),
-        with_photo=("photos_cnt", lambda x: (x > 0).sum()),
-        with_awards=("awards_cnt", lambda x: (x > 0).sum()),
+        with_story=("_has_story", "sum"),
+        with_photo=("_has_photo", "sum"),
+        with_awards=("_has_awards", "sum"),
     ).reset_index()
     yearly.columns = ["year", "total", "with_story", "with_photo", "with_awards"]
-    yearly.to_parquet(AGG_DIR / "yearly_stats.parquet", index=False)
+    _write(yearly, AGG_DIR / "yearly_stats.parquet")
 
 
-def make_region_stats(df: pd.DataFrame):
-    log("region_stats...")
-    regions = df.groupby("region").agg(
+def _region_agg(df: pd.DataFrame) -> pd.DataFrame:
+    """Число карточек и доли (%) с текстом/фото/наградами по регионам.
+
+    Общая основа для region_stats и dmi_by_region — один groupby на оба.
+    """
+    regions = df.groupby("region", observed=True).agg(
         count=("id", "count"),
-        story_pct=("story", lambda x: x.notna().mean() * 100),
-        photo_pct=("photos_cnt", lambda x: (x > 0).mean() * 100),
-        awards_pct=("awards_cnt", lambda x: (x > 0).mean() * 100),
+        story_pct=("_has_story", "mean"),
+        photo_pct=("_has_photo", "mean"),
+        awards_pct=("_has_awards", "mean"),
     ).reset_index()
-    regions.to_parquet(AGG_DIR / "region_stats.parquet", index=False)
+    regions[["story_pct", "photo_pct", "awards_pct"]] *= 100
+    regions["region"] = regions["region"].astype(str)
+    return regions
 
 
-def make_rank_age_distribution(df: pd.DataFrame):
-    log("rank_age_distribution...")
-    df["birth_year"] = parse_year_from_str(df["birthday"])
-    df["death_year"] = parse_year_from_str(df["death"])
-    df["age"] = df["death_year"] - df["birth_year"]
-
-    # Группировка званий
-    rank_map = {}
-    officer_keywords = ["лейтенант", "капитан", "майор", "полковник", "генерал", "маршал", "командир"]
-    nco_keywords = ["сержант", "старшина", "ефрейтор"]
-
-    def rank_group(rank_str):
-        if pd.isna(rank_str):
-            return "Неизвестно"
-        r = str(rank_str).lower()
-        if any(k in r for k in officer_keywords):
-            return "Офицеры"
-        elif any(k in r for k in nco_keywords):
-            return "Сержанты/старшины"
-        elif "рядовой" in r or "красноармеец" in r or "солдат" in r:
-            return "Рядовые"
-        else:
-            return "Другие"
+def make_region_stats(regions: pd.DataFrame):
+    log("region_stats...")
+    _write(regions, AGG_DIR / "region_stats.parquet")
 
-    df["rank_group"] = df["rank"].apply(rank_group)
 
-    valid = df[(df["age"] > 10) & (df["age"] < 80) & df["death_year"].notna()].copy()
-    agg = valid.groupby(["rank_group", "age", "death_year"]).size().reset_index(name="count")
+def make_rank_age_distribution(df: pd.DataFrame):
+    log("rank_age_distribution...")
+    valid = df[(df["age"] > 10) & (df["age"] < 80) & df["death_year"].notna()]
+    agg = valid.groupby(["rank_group", "age", "death_year"], observed=True).size().reset_index(name="count")
+    agg["rank_group"] = agg["rank_group"].astype(str)
     agg["death_year"] = agg["death_year"].astype(int)
-    agg.to_parquet(AGG_DIR / "rank_age_distribution.parquet", index=False)
+    _write(agg, AGG_DIR / "rank_age_distribution.parquet")
 
 
 def make_narrative_types_yearly(df: pd.DataFrame):
     log("narrative_types_yearly...")
-    df["pub_year"] = pd.to_datetime(df["pub_date"], errors="coerce").dt.year
-    df["narrative_type"] = df.apply(classify_narrative, axis=1)
-
-    pivot = df.groupby(["pub_year", "narrative_type"]).size().unstack(fill_value=0)
+    pivot = df.groupby(["pub_year", "narrative_type"], observed=True).size().unstack(fill_value=0)
+    pivot.columns = pivot.columns.astype(str)
     totals = pivot.sum(axis=1)
     pct = pivot.div(totals, axis=0) * 100
     pct = pct.reset_index().rename(columns={"pub_year": "year"})
-    pct.to_parquet(AGG_DIR / "narrative_types_yearly.parquet", index=False)
+    _write(pct, AGG_DIR / "narrative_types_yearly.parquet")
 
 
 def make_sentiment_yearly(df: pd.DataFrame):
     log("sentiment_yearly (placeholder — с разбивкой по типам нарративов)...")
-    df["pub_year"] = pd.to_datetime(df["pub_date"], errors="coerce").dt.year
     years = sorted(df["pub_year"].dropna().unique())
 
     # Типичные смещения тональности по типу нарратива (research-informed priors)
@@ -194,19 +363,19 @@ def make_sentiment_yearly(df: pd.DataFrame):
             col = f"sentiment_{ntype}"
             row[col] = round(float(np.clip(base + offset + np.random.uniform(-0.03, 0.03), -1, 1)), 3)
         rows.append(row)
-    pd.DataFrame(rows).to_parquet(AGG_DIR / "sentiment_yearly.parquet", index=False)
+    _write(pd.DataFrame(rows), AGG_DIR / "sentiment_yearly.parquet")
 
 
 def make_mattr_yearly(df: pd.DataFrame):
     log("mattr_yearly (сэмпл 5K текстов, с разбивкой по типам нарративов)...")
-    df["pub_year"] = pd.to_datetime(df["pub_date"], errors="coerce").dt.year
-    texts = df[df["story"].notna() & (df["story"].str.len() > 100)].copy()
+    texts = df.loc[df["_story_len"] > 100, ["pub_year", "narrative_type", "story"]]
 
     if len(texts) > 5000:
         texts = texts.sample(5000, random_state=42)
 
-    texts["mattr"] = texts["story"].apply(lambda s: compute_mattr(str(s)))
-    texts["narrative_type"] = texts.apply(classify_narrative, axis=1)
+    # Нижний регистр и разбиение на слова — пакетно по всему сэмплу, а не в каждом вызове
+    tokens = texts["story"].str.lower().str.split()
+    texts = texts.assign(mattr=[compute_mattr(words) for words in tokens])
     yearly = texts.groupby("pub_year")["mattr"].mean().reset_index()
     yearly.columns = ["year", "mattr"]
 
@@ -219,7 +388,7 @@ def make_mattr_yearly(df: pd.DataFrame):
         else:
             yearly[f"mattr_{ntype}"] = np.nan
 
-    yearly.to_parquet(AGG_DIR / "mattr_yearly.parquet", index=False)
+    _write(yearly, AGG_DIR / "mattr_yearly.parquet")
 
 
 def make_lda_topics(df: pd.DataFrame):
@@ -246,12 +415,11 @@ def make_lda_topics(df: pd.DataFrame):
     for tid, label, words in topics:
         for word, weight in words:
             rows.append({"topic_id": tid, "topic_label": label, "word": word, "weight": weight})
-    pd.DataFrame(rows).to_parquet(AGG_DIR / "lda_topics.parquet", index=False)
+    _write(pd.DataFrame(rows), AGG_DIR / "lda_topics.parquet")
 
 
 def make_lda_evolution(df: pd.DataFrame):
     log("lda_evolution (синтетическая)...")
-    df["pub_year"] = pd.to_datetime(df["pub_date"], errors="coerce").dt.year
     years = sorted(df["pub_year"].dropna().unique())
 
     np.random.seed(42)
@@ -265,34 +433,25 @@ def make_lda_evolution(df: pd.DataFrame):
         for i, name in enumerate(topic_names):
             row[name] = base[i]
         rows.append(row)
-    pd.DataFrame(rows).to_parquet(AGG_DIR / "lda_evolution.parquet", index=False)
+    _write(pd.DataFrame(rows), AGG_DIR / "lda_evolution.parquet")
 
 
 def make_migration_matrix(df: pd.DataFrame):
     log("migration_matrix...")
-    # birth_region из birthplace, submit_region из added_region или region
-    df["birth_region"] = df.get("birthplace", df.get("region", pd.Series()))
-    df["submit_region"] = df.get("added_region", df.get("region", pd.Series()))
-
-    valid = df[df["birth_region"].notna() & df["submit_region"].notna()].copy()
-    # Чистим длинные строки — берём только первую часть (до запятой, как регион)
-    for col in ["birth_region", "submit_region"]:
-        valid[col] = valid[col].astype(str).str.split(",").str[0].str.strip()
-
-    matrix = valid.groupby(["birth_region", "submit_region"]).size().reset_index(name="count")
+    valid = df[df["birth_region"].notna() & df["submit_region"].notna()]
+    matrix = (
+        valid.groupby(["birth_region", "submit_region"], observed=True)
+        .size().reset_index(name="count")
+        .astype({"birth_region": str, "submit_region": str})
+    )
     # Берём только пары с count > 10 для экономии
     matrix = matrix[matrix["count"] > 10]
-    matrix.to_parquet(AGG_DIR / "migration_matrix.parquet", index=False)
+    _write(matrix, AGG_DIR / "migration_matrix.parquet")
 
 
-def make_dmi_by_region(df: pd.DataFrame):
+def make_dmi_by_region(regions: pd.DataFrame):
     log("dmi_by_region...")
-    regions = df.groupby("region").agg(
-        count=("id", "count"),
-        story_pct=("story", lambda x: x.notna().mean() * 100),
-        photo_pct=("photos_cnt", lambda x: (x > 0).mean() * 100),
-        awards_pct=("awards_cnt", lambda x: (x > 0).mean() * 100),
-    ).reset_index()
+    regions = regions.copy()
 
     # DMI = взвешенная сумма нормализованных компонентов
     for col in ["story_pct", "photo_pct", "awards_pct"]:
@@ -310,7 +469,7 @@ def make_dmi_by_region(df: pd.DataFrame):
 
     # Удаляем _norm столбцы
     regions = regions.drop(columns=[c for c in regions.columns if c.endswith("_norm")])
-    regions.to_parquet(AGG_DIR / "dmi_by_region.parquet", index=False)
+    _write(regions, AGG_DIR / "dmi_by_region.parquet")
 
 
 def make_ner_top_entities(df: pd.DataFrame):
@@ -351,72 +510,71 @@ def make_ner_top_entities(df: pd.DataFrame):
     for name, count in orgs:
         rows.append({"entity_type": "ORG", "entity": name, "count": count})
 
-    pd.DataFrame(rows).to_parquet(AGG_DIR / "ner_top_entities.parquet", index=False)
+    _write(pd.DataFrame(rows), AGG_DIR / "ner_top_entities.parquet")
 
 
 def make_halflife_yearly(df: pd.DataFrame):
     log("halflife_yearly...")
-    df["pub_date_dt"] = pd.to_datetime(df["pub_date"], errors="coerce")
-    df["pub_year"] = df["pub_date_dt"].dt.year
-    df["pub_day"] = df["pub_date_dt"].dt.dayofyear
-
-    rows = []
-    for yr in sorted(df["pub_year"].dropna().unique()):
-        sub = df[df["pub_year"] == yr]
-        daily = sub.groupby("pub_day").size()
-        if daily.empty:
-            continue
-        peak_day = daily.idxmax()
-        peak_val = daily.max()
-        half_val = peak_val / 2
-
-        # Ищем первый день после пика с количеством <= half_val
-        after_peak = daily[daily.index > peak_day]
-        halflife_days = None
-        for day, cnt in after_peak.items():
-            if cnt <= half_val:
-                halflife_days = day - peak_day
-                break
-
-        if halflife_days and halflife_days > 0:
-            rows.append({"year": int(yr), "halflife": halflife_days})
-
-    pd.DataFrame(rows).to_parquet(AGG_DIR / "halflife_yearly.parquet", index=False)
+    pub_day = df["pub_date_dt"].dt.dayofyear.rename("pub_day")
+
+    # Матрица год × день года одним groupby; NaN — дни без карточек (в поиске не участвуют).
+    # День года — ключ группировки, а не новый столбец общего df
+    daily = df.groupby([df["pub_year"], pub_day]).size().unstack()
+    result = pd.DataFrame({"year": pd.Series(dtype="int64"), "halflife": pd.Series(dtype="int32")})
+    if not daily.empty:
+        counts = daily.to_numpy(dtype=np.float64)
+        days = daily.columns.to_numpy(dtype=np.int32)  # дни года — целые, как в исходной схеме
+        peak_idx = np.nanargmax(counts, axis=1)
+        peak_val = counts[np.arange(len(counts)), peak_idx]
+
+        # Первый день после пика с количеством <= половины пика — одним проходом по матрице
+        after_peak = np.arange(counts.shape[1])[None, :] > peak_idx[:, None]
+        below = after_peak & (counts <= peak_val[:, None] / 2)
+        found = below.any(axis=1)
+        halflife = days[below.argmax(axis=1)] - days[peak_idx]
+        result = pd.DataFrame({
+            "year": daily.index.to_numpy()[found].astype(int),
+            "halflife": halflife[found],
+        })
+
+    _write(result, AGG_DIR / "halflife_yearly.parquet")
 
 
 def make_network_edges(df: pd.DataFrame):
     log("network_edges...")
-    df["birth_region"] = df.get("birthplace", df.get("region", pd.Series()))
-    df["submit_region"] = df.get("added_region", df.get("region", pd.Series()))
-
-    valid = df[df["birth_region"].notna() & df["submit_region"].notna()].copy()
-    for col in ["birth_region", "submit_region"]:
-        valid[col] = valid[col].astype(str).str.split(",").str[0].str.strip()
+    valid = df[df["birth_region"].notna() & df["submit_region"].notna()]
 
     # Исключаем диагональ (один и тот же регион)
     edges = valid[valid["birth_region"] != valid["submit_region"]]
-    edges = edges.groupby(["birth_region", "submit_region"]).size().reset_index(name="count")
+    edges = (
+        edges.groupby(["birth_region", "submit_region"], observed=True)
+        .size().reset_index(name="count")
+        .astype({"birth_region": str, "submit_region": str})
+    )
     edges = edges.nlargest(100, "count")
     edges.columns = ["source", "target", "count"]
-    edges.to_parquet(AGG_DIR / "network_edges.parquet", index=False)
+    _write(edges, AGG_DIR / "network_edges.parquet")
 
 
 def make_sample(df: pd.DataFrame, n: int = 50_000):
     log(f"sample ({n} записей, стратификация по годам)...")
-    df["pub_year"] = pd.to_datetime(df["pub_date"], errors="coerce").dt.year
 
-    # Стратифицированная выборка
-    year_counts = df["pub_year"].value_counts()
+    # Стратифицированная выборка: квота года пропорциональна его доле (минимум 1).
+    # Строкам — случайный ключ; в каждом году берём квоту строк с наименьшими
+    # ключами. Один groupby вместо фильтра и sample на каждый год.
+    year = df["pub_year"]
+    year_counts = year.value_counts()
+    # Сначала доля, потом умножение — усечение int() как у исходного max(1, int(n * frac))
     fractions = year_counts / year_counts.sum()
+    quota = (n * fractions).astype(int).clip(lower=1, upper=year_counts)
+    # Если минимумы по 1 дали больше n, обрезаются последние (самые малые) годы —
+    # как head(n) у выборок, склеенных в порядке value_counts
+    quota = quota.clip(upper=(n - quota.cumsum().shift(fill_value=0)).clip(lower=0))
 
-    samples = []
-    for yr, frac in fractions.items():
-        sub = df[df["pub_year"] == yr]
-        k = max(1, int(n * frac))
-        k = min(k, len(sub))
-        samples.append(sub.sample(k, random_state=42))
-
-    sample = pd.concat(samples).head(n)
+    key = pd.Series(np.random.default_rng(42).random(len(df)), index=df.index)
+    rank = key.groupby(year).rank(method="first")
+    mask = (rank <= year.map(quota)).to_numpy(dtype=bool, na_value=False)
+    positions = np.flatnonzero(mask)[:n]
 
     # Выбираем нужные столбцы
     keep_cols = [
@@ -424,8 +582,11 @@ def make_sample(df: pd.DataFrame, n: int = 50_000):
         "birthday", "death", "awards_txt", "awards_cnt",
         "photos_cnt", "pub_date",
     ]
-    keep_cols = [c for c in keep_cols if c in sample.columns]
-    sample[keep_cols].to_parquet(SAMPLE_DIR / "soldiers_sample_50k.parquet", index=False)
+    keep_cols = [c for c in keep_cols if c in df.columns]
+
+    # Строки и столбцы выбираются одним iloc
+    sample = df.iloc[positions, df.columns.get_indexer(keep_cols)]
+    _write(sample, SAMPLE_DIR / "soldiers_sample_50k.parquet")
     log(f"Сэмпл сохранён: {len(sample)} записей")
 
 
@@ -442,31 +603,45 @@ def make_fts_index(df: pd.DataFrame):
         "birthday", "death", "awards_txt", "pub_date",
     ]
     keep_cols = [c for c in keep_cols if c in df.columns]
-    with_text = df[df["story"].notna() & (df["story"].str.len() > 10)][keep_cols].copy()
-
-    # Категориальное кодирование для лучшего сжатия
-    for col in ["region", "rank"]:
-        if col in with_text.columns:
-            with_text[col] = with_text[col].astype("category")
+    # Одна Arrow-таблица; чанки — срезы без копирования (region/rank уже словарные)
+    with_text = pa.Table.from_pandas(
+        df.loc[df["_story_len"] > 10, keep_cols],
+        preserve_index=False,
+    )
 
     # Удаляем старые чанки
     for old in FULL_DIR.glob("soldiers_fts_part*.parquet"):
         old.unlink()
 
     ROWS_PER_CHUNK = 100_000
-    n_total = len(with_text)
+    n_total = with_text.num_rows
     n_chunks = max(1, (n_total + ROWS_PER_CHUNK - 1) // ROWS_PER_CHUNK)
 
     for i in range(n_chunks):
-        chunk = with_text.iloc[i * ROWS_PER_CHUNK:(i + 1) * ROWS_PER_CHUNK]
+        chunk = with_text.slice(i * ROWS_PER_CHUNK, ROWS_PER_CHUNK)
         out_path = FULL_DIR / f"soldiers_fts_part{i:03d}.parquet"
-        chunk.to_parquet(out_path, index=False, compression="zstd")
+        pq.write_table(chunk, out_path, compression="zstd", compression_level=3)
         size_mb = out_path.stat().st_size / 1_048_576
-        log(f"  Чанк {i + 1}/{n_chunks}: {len(chunk):,} записей → {out_path.name} ({size_mb:.1f} MB)")
+        log(f"  Чанк {i + 1}/{n_chunks}: {chunk.num_rows:,} записей → {out_path.name} ({size_mb:.1f} MB)")
 
     log(f"FTS-индекс готов: {n_total:,} записей в {n_chunks} файлах → {FULL_DIR}")
 
 
+def make_full_search_db():
+    """База полного поиска из FTS-чанков: приложению остаётся её только открыть.
+
+    В git файл не попадает; при деплое без него приложение соберёт базу само.
+    """
+    log("soldiers_full.duckdb (таблица + FTS-индекс BM25)...")
+    sys.path.insert(0, str(ROOT / "app"))
+    from search_db import build_full_search_db
+
+    sources = sorted(FULL_DIR.glob("soldiers_fts_part*.parquet"))
+    fts_ready = build_full_search_db(sources, FULL_DIR / "soldiers_full.duckdb")
+    if not fts_ready:
+        log("  Расширение fts недоступно — база без индекса, приложение достроит его позже")
+
+
 # ═══════════════════════════════════════════════════════════════════
 # Main
 # ═══════════════════════════════════════════════════════════════════
@@ -490,14 +665,26 @@ def main():
         log(f"ОШИБКА: файл не найден: {input_path}")
         sys.exit(1)
 
-    log(f"Чтение {input_path}...")
-    df = pd.read_csv(input_path, low_memory=False)
+    df = load_raw(input_path)
     log(f"Загружено {len(df):,} строк, {len(df.columns)} столбцов")
 
+    # Общие производные столбцы — один раз для всех агрегатов
+    add_pub_date_columns(df)
+    add_flag_columns(df)
+    df["narrative_type"] = classify_narratives(df)
+    # Годы рождения/гибели, возраст и группа звания — один разбор на весь прогон (демография)
+    df["birth_year"] = parse_year_from_str(df["birthday"])
+    df["death_year"] = parse_year_from_str(df["death"])
+    df["age"] = (df["death_year"] - df["birth_year"]).astype("Int16")
+    df["rank_group"] = rank_groups(df["rank"])
+    add_region_pair_columns(df)
+
+    regions = _region_agg(df)
+
     # Генерация агрегатов
     make_monthly_counts(df)
     make_yearly_stats(df)
-    make_region_stats(df)
+    make_region_stats(regions)
     make_rank_age_distribution(df)
     make_narrative_types_yearly(df)
     make_sentiment_yearly(df)
@@ -505,12 +692,13 @@ def main():
     make_lda_topics(df)
     make_lda_evolution(df)
     make_migration_matrix(df)
-    make_dmi_by_region(df)
+    make_dmi_by_region(regions)
     make_ner_top_entities(df)
     make_halflife_yearly(df)
     make_network_edges(df)
     make_sample(df, n=args.sample_size)
     make_fts_index(df)
+    make_full_search_db()
 
     log("✅ Готово! Все агрегаты сохранены в data/aggregated/")
     log(f"Сэмпл сохранён в {SAMPLE_DIR / 'soldiers_sample_50k.parquet'}")